@@ -0,0 +1,209 @@
+# enjinuity
+# Written in 2016 by David H. Wei <https://github.com/spikeh/>
+#
+# To the extent possible under law, the author(s) have dedicated all
+# copyright and related and neighboring rights to this software to the
+# public domain worldwide. This software is distributed without any
+# warranty.
+#
+# You should have received a copy of the CC0 Public Domain Dedication
+# along with this software. If not, see
+# <http://creativecommons.org/publicdomain/zero/1.0/>.
+import mmap
+import os
+import pickle
+import struct
+import threading
+import zlib
+from collections.abc import MutableMapping
+
+MAGIC = b'ENJARC1\n'
+INDEX_MAGIC = b'ENJIDX1\n'
+# url length, page length
+record_header = struct.Struct('<II')
+# offset of the index, INDEX_MAGIC
+trailer = struct.Struct('<Q8s')
+# URL of the record of when the pages were scraped, kept out of the pages
+SCRAPED_URL = ''
+
+
+class Archive(MutableMapping):
+    """Single-file store of compressed pages, looked up by URL.
+
+    The file is MAGIC followed by one record per page: a header, the URL
+    and the zlib-compressed page. Closing the archive appends an index of
+    URL -> (offset, length) and a trailer pointing at it.
+
+    Mode 'r' memory-maps the file and decompresses pages on lookup. Mode
+    'a' appends to an existing archive, or creates it, and 'w' always
+    starts a new one. An archive that was not closed, e.g. after a crash,
+    has its index rebuilt from the records when it is opened again.
+
+    `scraped` is when the pages were scraped, or None if the archive does
+    not say; set_scraped() records it.
+    """
+
+    def __init__(self, filename, mode='r', level=6):
+        self.filename = filename
+        self.mode = mode
+        self.level = level
+        self.lock = threading.Lock()
+        self.index = {}
+        self.file = None
+        self.map = None
+        self.scraped = None
+        self.scraped_record = None
+        if mode == 'r':
+            self.file = open(filename, 'rb')
+            self.map = mmap.mmap(self.file.fileno(), 0,
+                                 access=mmap.ACCESS_READ)
+            if self.map[:len(MAGIC)] != MAGIC:
+                raise ValueError('Not an archive: {}'.format(filename))
+            if not self._read_index(self.map):
+                self._scan(self.map)
+            self._read_scraped()
+        elif mode == 'a' and os.path.exists(filename):
+            self.file = open(filename, 'r+b')
+            data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                if data[:len(MAGIC)] != MAGIC:
+                    raise ValueError('Not an archive: {}'.format(filename))
+                end = self._read_index(data) or self._scan(data)
+            finally:
+                data.close()
+            # Drop the old index, a new one is written on close
+            self.file.truncate(end)
+            self.file.seek(end)
+            self._read_scraped()
+        elif mode in ('a', 'w'):
+            self.file = open(filename, 'w+b')
+            self.file.write(MAGIC)
+        else:
+            raise ValueError('Unknown mode {}'.format(mode))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+    # Other processes map the file themselves
+    def __reduce__(self):
+        if self.map is None:
+            raise TypeError('Only read-only archives can be pickled')
+        return (Archive, (self.filename,))
+
+    def _read_index(self, data):
+        if len(data) < len(MAGIC) + trailer.size:
+            return None
+        offset, magic = trailer.unpack(data[-trailer.size:])
+        if magic != INDEX_MAGIC:
+            return None
+        self.index = pickle.loads(data[offset:-trailer.size])
+        return offset
+
+    def _scan(self, data):
+        print('WARN:\tRebuilding index of:\t', self.filename)
+        pos = len(MAGIC)
+        while pos + record_header.size <= len(data):
+            url_len, page_len = record_header.unpack_from(data, pos)
+            start = pos + record_header.size + url_len
+            if start + page_len > len(data):
+                break
+            url = data[pos + record_header.size:start].decode()
+            self.index[url] = (start, page_len)
+            pos = start + page_len
+        # Anything after the last complete record is a torn write
+        return pos
+
+    def _read_scraped(self):
+        self.scraped_record = self.index.pop(SCRAPED_URL, None)
+        if self.scraped_record:
+            self.scraped = pickle.loads(zlib.decompress(
+                    self._read(*self.scraped_record)))
+
+    def _read(self, offset, length):
+        if self.map is not None:
+            return self.map[offset:offset + length]
+        with self.lock:
+            self.file.flush()
+            return os.pread(self.file.fileno(), length, offset)
+
+    def __getitem__(self, url):
+        offset, length = self.index[url]
+        return zlib.decompress(self._read(offset, length))
+
+    def _write(self, url, page):
+        if self.map is not None:
+            raise TypeError('Archive is read-only')
+        key = url.encode()
+        data = zlib.compress(page, self.level)
+        with self.lock:
+            self.file.write(record_header.pack(len(key), len(data)))
+            self.file.write(key)
+            offset = self.file.tell()
+            self.file.write(data)
+        return offset, len(data)
+
+    def __setitem__(self, url, page):
+        record = self._write(url, page)
+        with self.lock:
+            self.index[url] = record
+
+    def set_scraped(self, when):
+        self.scraped_record = self._write(
+                SCRAPED_URL, pickle.dumps(when, pickle.HIGHEST_PROTOCOL))
+        self.scraped = when
+
+    def __delitem__(self, url):
+        # The page stays in the file but is left out of the index
+        with self.lock:
+            del self.index[url]
+
+    def __iter__(self):
+        return iter(list(self.index))
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, url):
+        return url in self.index
+
+    # Make alias look up the same page as url without storing it twice
+    def link(self, alias, url):
+        with self.lock:
+            self.index[alias] = self.index[url]
+
+    def flush(self):
+        if self.map is None:
+            with self.lock:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+
+    def close(self):
+        if self.file is None or self.file.closed:
+            return
+        if self.map is not None:
+            self.map.close()
+        else:
+            index = self.index
+            if self.scraped_record:
+                index = dict(index)
+                index[SCRAPED_URL] = self.scraped_record
+            with self.lock:
+                offset = self.file.tell()
+                pickle.dump(index, self.file, pickle.HIGHEST_PROTOCOL)
+                self.file.write(trailer.pack(offset, INDEX_MAGIC))
+        self.file.close()
+
+
+def load_site(filename):
+    with open(filename, 'rb') as f:
+        is_archive = f.read(len(MAGIC)) == MAGIC
+    if is_archive:
+        return Archive(filename)
+    # Sites dumped before the archive format are pickled dicts
+    return pickle.load(open(filename, 'rb'))
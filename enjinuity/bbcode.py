@@ -0,0 +1,221 @@
+# enjinuity
+# Written in 2016 by David H. Wei <https://github.com/spikeh/>
+# and Italo Cotta <https://github.com/itcotta/>
+#
+# To the extent possible under law, the author(s) have dedicated all
+# copyright and related and neighboring rights to this software to the
+# public domain worldwide. This software is distributed without any
+# warranty.
+#
+# You should have received a copy of the CC0 Public Domain Dedication
+# along with this software. If not, see
+# <http://creativecommons.org/publicdomain/zero/1.0/>.
+from lxml import html
+
+fontpx_map = {
+    '8px': 'xx-small',
+    '10px': 'x-small',
+    '12px': 'small',
+    '14px': 'medium',
+    '18px': 'x-large',
+    '24px': 'xx-large'
+}
+
+
+class Converter:
+    """Convert an HTML tree to BBCode with rules looked up per element.
+
+    A rule is called as rule(element, text), where text is the stripped
+    conversion of the element's content, and returns the element's
+    BBCode. Empty results are dropped. Rules are registered for a tag,
+    optionally restricted to elements carrying all of a set of classes;
+    class rules are tried in the order they were registered, before the
+    plain rule for the tag. Tags without a rule keep their text.
+    """
+
+    def __init__(self):
+        self.rules = {}
+        self.class_rules = {}
+
+    def register(self, tags, rule, classes=()):
+        for tag in tags:
+            if classes:
+                self.class_rules.setdefault(tag, []).append(
+                        (frozenset(classes), rule))
+            else:
+                self.rules[tag] = rule
+
+    def rule(self, *tags, classes=()):
+        def decorator(func):
+            self.register(tags, func, classes)
+            return func
+        return decorator
+
+    def apply(self, element, text):
+        tag = element.tag
+        by_class = self.class_rules.get(tag)
+        if by_class:
+            elem_classes = set((element.get('class') or '').split(' '))
+            for required, rule in by_class:
+                if required <= elem_classes:
+                    return rule(element, text)
+        rule = self.rules.get(tag)
+        if rule is None:
+            return keep_text(element, text)
+        return rule(element, text)
+
+    # Walk the tree depth first with an explicit stack. Each open element
+    # remembers where its content starts in the shared output buffer; when
+    # it is closed that slice is replaced by the element's BBCode.
+    def convert(self, tree):
+        out = []
+        if tree.text:
+            out.append(tree.text)
+        stack = [(tree, iter(tree), 0)]
+        while stack:
+            parent, children, start = stack[-1]
+            for child in children:
+                if isinstance(child, html.HtmlElement):
+                    stack.append((child, iter(child), len(out)))
+                    if child.text:
+                        out.append(child.text)
+                    break
+                # Comments and processing instructions only keep their tail
+                if child.tail:
+                    out.append(child.tail)
+            else:
+                stack.pop()
+                if not stack:
+                    break
+                text = ''.join(out[start:]).strip()
+                del out[start:]
+                result = self.apply(parent, text)
+                if result:
+                    out.append(result)
+                if parent.tail:
+                    out.append(parent.tail)
+        return ''.join(out).strip()
+
+    # Convert element itself, tail included, as convert() would if it
+    # were the only child of the tree
+    def convert_element(self, element):
+        out = []
+        result = self.apply(element, self.convert(element))
+        if result:
+            out.append(result)
+        if element.tail:
+            out.append(element.tail)
+        return ''.join(out).strip()
+
+
+def keep_text(element, text):
+    if text:
+        return text.rstrip()
+
+def drop(element, text):
+    return ''
+
+def wrap(fmt):
+    def rule(element, text):
+        return fmt.format(text=text)
+    return rule
+
+mybb = Converter()
+mybb.register(['b', 'strong'], wrap('[b]{text}[/b]'))
+mybb.register(['em', 'i'], wrap('[i]{text}[/i]'))
+mybb.register(['del', 's', 'strike'], wrap('[s]{text}[/s]'))
+mybb.register(['u'], wrap('[u]{text}[/u]'))
+mybb.register(['title'], drop)
+# Numbered list
+mybb.register(['ol'], wrap('[list=1]{text}[/list]'))
+# Bullet list
+mybb.register(['ul'], wrap('[list]{text}[/list]'))
+# List item
+mybb.register(['li'], wrap('[*]{text}'))
+
+@mybb.rule('br')
+def line_break(element, text):
+    return '\r'
+
+@mybb.rule('a')
+def link(element, text):
+    # Empty links are dropped
+    if not text:
+        return ''
+    return "[url={link}]{text}[/url]".format(link=element.get('href'),
+                                             text=text)
+
+@mybb.rule('img')
+def image(element, text):
+    if element.get('class') == 'bbcode_smiley':
+        return element.get('title')
+    return "[img]{link}[/img]".format(link=element.get('src'))
+
+@mybb.rule('span')
+def span(element, text):
+    style = element.get('style')
+    if not style:
+        return text
+    if 'font-size' in style:
+        size = style.split(':')[1]
+        return "[size={size}]{text}[/size]".format(text=text,
+                                                   size=fontpx_map[size])
+    if 'color' in style:
+        hexcolor = style.split('#')[1]
+        return "[color=#{color}]{text}[/color]".format(text=text,
+                                                       color=hexcolor)
+    return keep_text(element, text)
+
+@mybb.rule('param')
+def param(element, text):
+    value = element.get('value')
+    if element.get('name') == 'movie' and "youtube" in value:
+        video = value.split('&')[0].split('/')[4]
+        return ("[video=youtube]http://youtube.com/watch?v={value}"
+                "[/video]").format(value=video)
+    return keep_text(element, text)
+
+@mybb.rule('hr')
+def horizontal_rule(element, text):
+    if element.get('class') == 'bbcode_rule':
+        return "[hr]"
+    return keep_text(element, text)
+
+mybb.register(['div'], wrap('[code]{text}[/code]'),
+              classes=['bbcode_code_body'])
+# Ignore unnecessary elements related to quote/code/spoiler tags
+for cls in ['bbcode_code_head', 'bbcode_quote_decorator', 'element_avatar',
+            'user', 'spoiler-title']:
+    mybb.register(['div'], drop, classes=[cls])
+mybb.register(['div'], wrap('[spoiler]{text}[/spoiler]'),
+              classes=['bbcode', 'spoiler'])
+
+@mybb.rule('div', classes=['bbcode_quote'])
+def quote(element, text):
+    quote_head = list(element)[1]
+    who = quote_head.find('div[2]/a')
+    # Properly formatted quote block, with a linked author
+    if who is not None:
+        txt = text.split('wrote:')[-1]
+        return "[quote='{}']\r{}\r[/quote]\r\r".format(who.text, txt)
+    text_split = text.strip().split('wrote:')
+    if len(text_split) == 1:
+        text_split = text.strip().split('Quote:')
+    text_split = [x.strip() for x in text_split]
+    # Text on both sides of 'wrote:'
+    if len(text_split) == 2 and text_split[0] and text_split[1]:
+        return "[quote='{}']\r{}\r[/quote]\r\r".format(*text_split)
+    return "[quote]\r{}\r[/quote]\r\r".format(''.join(text_split))
+
+align_map = {
+    'text-align:center': 'center',
+    'text-align:left': 'left',
+    'text-align:right': 'right'
+}
+
+@mybb.rule('div')
+def align(element, text):
+    alignment = align_map.get(element.get('style'))
+    if alignment:
+        return "[align={}]{}[/align]".format(alignment, text)
+    return keep_text(element, text)
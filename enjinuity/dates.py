@@ -0,0 +1,96 @@
+# enjinuity
+# Written in 2016 by David H. Wei <https://github.com/spikeh/>
+# and Italo Cotta <https://github.com/itcotta/>
+#
+# To the extent possible under law, the author(s) have dedicated all
+# copyright and related and neighboring rights to this software to the
+# public domain worldwide. This software is distributed without any
+# warranty.
+#
+# You should have received a copy of the CC0 Public Domain Dedication
+# along with this software. If not, see
+# <http://creativecommons.org/publicdomain/zero/1.0/>.
+from datetime import datetime, timedelta, timezone
+from enjinuity.layout import layout
+from functools import lru_cache
+
+weekday_map = {
+    'Mon': 0,
+    'Tue': 1,
+    'Wed': 2,
+    'Thu': 3,
+    'Fri': 4,
+    'Sat': 5,
+    'Sun': 6
+}
+
+# Units of '12 hours ago'; anything else is read as minutes
+ago_units = {
+    'second': 'seconds',
+    'minute': 'minutes',
+    'hour': 'hours',
+    'day': 'days'
+}
+
+# Enjin shows the times of recent posts in this timezone
+weekday_tz = timezone(timedelta(hours=1))
+
+def parse_date(string, now):
+    if string == 'Online Now':
+        return now
+    match = layout.time_prefix.search(string)
+    if match:
+        timestr = match.group(1)
+    else:
+        timestr = string
+    match = layout.date.search(timestr)
+    # Jan 23, 15
+    if match:
+        return datetime.strptime(timestr, '%b %d, %y').replace(
+          tzinfo=timezone.utc)
+    match = layout.time_ago.search(timestr)
+    # 12 hours ago
+    # 5 minutes ago
+    if match:
+        unit = ago_units.get(match.group(2).rstrip('s'), 'minutes')
+        return now - timedelta(**{unit: int(match.group(1))})
+    match = layout.weekday_time.search(timestr)
+    # Sun at 03:52 pm or Tue at 21:20
+    if match:
+        if match.group('half'):
+            posttime = datetime.strptime(match.group('half'), '%I:%M %p')
+        else:
+            posttime = datetime.strptime(match.group('full'), '%H:%M')
+        # Within the last week, and a week ago on the same weekday
+        days = (now.weekday() - weekday_map[match.group(1)]) % 7 or 7
+        postdt = (now - timedelta(days=days)).replace(
+          hour=posttime.hour, minute=posttime.minute, second=posttime.second)
+        return postdt.replace(tzinfo=weekday_tz)
+    raise ValueError('Unknown date format: {}'.format(string))
+
+# Posts of the same day share their dates, so most lookups are repeats
+@lru_cache(maxsize=4096)
+def get_timestamp(string, now):
+    return int(parse_date(string, now).timestamp())
+
+
+class Clock:
+    """Converts the dates shown by Enjin to Unix timestamps.
+
+    Relative dates, like '5 minutes ago' or 'Sun at 03:52 pm', are taken
+    relative to `now`, which is fixed when the clock is created; pass the
+    time the pages were scraped if it is known. A naive `now` is in UTC.
+    """
+
+    def __init__(self, now=None):
+        if now is None:
+            now = datetime.now(tz=timezone.utc)
+        elif now.tzinfo is None:
+            now = now.replace(tzinfo=timezone.utc)
+        self.now = now
+
+    def timestamp(self, string):
+        return get_timestamp(string, self.now)
+
+    def timestamps(self, strings):
+        return [get_timestamp(s, self.now) for s in strings]
@@ -0,0 +1,81 @@
+# enjinuity
+# Written in 2016 by David H. Wei <https://github.com/spikeh/>
+#
+# To the extent possible under law, the author(s) have dedicated all
+# copyright and related and neighboring rights to this software to the
+# public domain worldwide. This software is distributed without any
+# warranty.
+#
+# You should have received a copy of the CC0 Public Domain Dedication
+# along with this software. If not, see
+# <http://creativecommons.org/publicdomain/zero/1.0/>.
+import pickle
+from enjinuity.metrics import metrics
+
+MAGIC = b'ENJDMP1\n'
+
+
+class DumpWriter:
+    """Writes database rows to a file as they are produced.
+
+    Rows are appended to db[table] as with a dict of lists, and flush()
+    writes each table's buffered rows as one pickled (table, rows) frame
+    after MAGIC. The dump starts with an empty frame for every table in
+    `tables`, so they are all present, in that order, when it is loaded.
+    """
+
+    def __init__(self, filename, tables=()):
+        self.file = open(filename, 'wb')
+        self.file.write(MAGIC)
+        self.buffers = {}
+        for table in tables:
+            self.buffers[table] = []
+            pickle.dump((table, []), self.file, pickle.HIGHEST_PROTOCOL)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getitem__(self, table):
+        try:
+            return self.buffers[table]
+        except KeyError:
+            rows = self.buffers[table] = []
+            return rows
+
+    def flush(self):
+        for table, rows in self.buffers.items():
+            if rows:
+                pickle.dump((table, rows), self.file,
+                            pickle.HIGHEST_PROTOCOL)
+                metrics.add('rows.' + table, len(rows))
+                self.buffers[table] = []
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.flush()
+        self.file.close()
+
+
+# (table, rows) frames of a dump, in the order they were written
+def iter_dump(filename):
+    with open(filename, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            # Dumps written in one go are a pickled dict of tables
+            f.seek(0)
+            yield from pickle.load(f).items()
+            return
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                break
+
+def load_dump(filename):
+    db = {}
+    for table, rows in iter_dump(filename):
+        db.setdefault(table, []).extend(rows)
+    return db
@@ -0,0 +1,120 @@
+# enjinuity
+# Written in 2016 by David H. Wei <https://github.com/spikeh/>
+#
+# To the extent possible under law, the author(s) have dedicated all
+# copyright and related and neighboring rights to this software to the
+# public domain worldwide. This software is distributed without any
+# warranty.
+#
+# You should have received a copy of the CC0 Public Domain Dedication
+# along with this software. If not, see
+# <http://creativecommons.org/publicdomain/zero/1.0/>.
+import requests
+import threading
+import time
+from enjinuity.metrics import metrics
+from lxml import etree, html
+from requests.adapters import HTTPAdapter
+from selenium import webdriver
+
+
+class BrowserFetcher:
+    """Fetch pages by rendering them in a headless browser.
+
+    The browser is only started on the first request, so a fetcher that
+    is never used as a fallback costs nothing.
+    """
+
+    def __init__(self, base_url, browser=None):
+        self.base_url = base_url
+        self.browser = browser
+        self.lock = threading.Lock()
+
+    def get_browser(self):
+        if self.browser is None:
+            self.browser = webdriver.PhantomJS()
+        return self.browser
+
+    def get(self, url, check=None):
+        with self.lock:
+            browser = self.get_browser()
+            start = time.perf_counter()
+            browser.get(url)
+            metrics.observe('fetch_seconds', time.perf_counter() - start)
+            metrics.add('pages_fetched')
+            return html.fromstring(browser.page_source, self.base_url)
+
+    def get_cookies(self):
+        return self.get_browser().get_cookies()
+
+    def get_user_agent(self):
+        return self.get_browser().execute_script(
+                'return navigator.userAgent;')
+
+    def quit(self):
+        if self.browser:
+            self.browser.quit()
+            self.browser = None
+
+
+class HttpFetcher:
+    """Fetch server-rendered pages over a keep-alive HTTP session.
+
+    Cookies and the user agent of a logged in browser can be carried
+    over, so the session sees the same pages as the browser did. Pages
+    that fail to load, or that fail the structural `check` passed to
+    get(), are fetched again through `fallback`.
+    """
+
+    def __init__(self, base_url, cookies=(), user_agent=None, fallback=None,
+                 pool_size=10, timeout=30):
+        self.base_url = base_url
+        self.fallback = fallback
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if user_agent:
+            self.session.headers['User-Agent'] = user_agent
+        for c in cookies:
+            self.session.cookies.set(c['name'], c['value'],
+                                     domain=c.get('domain', ''),
+                                     path=c.get('path', '/'))
+
+    @classmethod
+    def from_browser(cls, fetcher, **kwargs):
+        return cls(fetcher.base_url, fetcher.get_cookies(),
+                   fetcher.get_user_agent(), fetcher, **kwargs)
+
+    def _request(self, url):
+        start = time.perf_counter()
+        resp = self.session.get(url, timeout=self.timeout)
+        metrics.observe('fetch_seconds', time.perf_counter() - start)
+        resp.raise_for_status()
+        metrics.add('pages_fetched')
+        # requests assumes ISO-8859-1 when the server omits the charset
+        if 'charset' not in resp.headers.get('content-type', ''):
+            resp.encoding = 'utf-8'
+        return html.fromstring(resp.text, self.base_url)
+
+    def get(self, url, check=None):
+        try:
+            elem = self._request(url)
+        except (requests.RequestException, etree.ParserError) as e:
+            metrics.add('fetch_errors')
+            if self.fallback is None:
+                raise
+            metrics.add('fetch_fallbacks')
+            print('WARN:\tHTTP fetch failed, using fallback:\t', url, e)
+            return self.fallback.get(url, check)
+        if check is None or check(elem) or self.fallback is None:
+            return elem
+        metrics.add('fetch_fallbacks')
+        print('WARN:\tPage failed check, using fallback:\t', url)
+        return self.fallback.get(url, check)
+
+    def quit(self):
+        self.session.close()
+        if self.fallback:
+            self.fallback.quit()
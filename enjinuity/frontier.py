@@ -0,0 +1,93 @@
+# enjinuity
+# Written in 2016 by David H. Wei <https://github.com/spikeh/>
+#
+# To the extent possible under law, the author(s) have dedicated all
+# copyright and related and neighboring rights to this software to the
+# public domain worldwide. This software is distributed without any
+# warranty.
+#
+# You should have received a copy of the CC0 Public Domain Dedication
+# along with this software. If not, see
+# <http://creativecommons.org/publicdomain/zero/1.0/>.
+import heapq
+import itertools
+import re
+from urllib.parse import urlsplit, urlunsplit
+
+# Kinds of pages in the crawl
+INDEX = 0
+FORUM = 1
+FORUM_PAGE = 2
+THREAD = 3
+THREAD_PAGE = 4
+
+# Lower is visited first: forum listings before any thread pages
+PRIORITY = {
+    INDEX: 0,
+    FORUM: 0,
+    FORUM_PAGE: 0,
+    THREAD: 1,
+    THREAD_PAGE: 1
+}
+
+slashes = re.compile(r'/{2,}')
+
+default_ports = {
+    'http': '80',
+    'https': '443'
+}
+
+def normalize_url(url):
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    host, _, port = netloc.partition(':')
+    if port == default_ports.get(scheme):
+        netloc = host
+    path = slashes.sub('/', parts.path)
+    if len(path) > 1:
+        path = path.rstrip('/')
+    return urlunsplit((scheme, netloc, path or '/', parts.query, ''))
+
+
+class Frontier:
+    """Pages waiting to be crawled, ordered by priority.
+
+    Every URL is accepted at most once, however it is spelt. Entries of
+    the same priority come out in the order they went in.
+    """
+
+    def __init__(self):
+        self._heap = []
+        # Normalized URL -> the URL it was first pushed as
+        self._seen = {}
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __contains__(self, url):
+        return normalize_url(url) in self._seen
+
+    def canonical(self, url):
+        return self._seen.get(normalize_url(url))
+
+    # Accept url without queueing it, e.g. when it was already fetched
+    def mark(self, url):
+        self._seen.setdefault(normalize_url(url), url)
+
+    def push(self, kind, url):
+        key = normalize_url(url)
+        if key in self._seen:
+            return False
+        self._seen[key] = url
+        heapq.heappush(self._heap,
+                       (PRIORITY[kind], next(self._counter), kind, url))
+        return True
+
+    def pop(self):
+        _, _, kind, url = heapq.heappop(self._heap)
+        return kind, url
+
+    def pending(self):
+        return [(kind, url) for _, _, kind, url in sorted(self._heap)]
@@ -0,0 +1,121 @@
+# enjinuity
+# Written in 2016 by David H. Wei <https://github.com/spikeh/>
+#
+# To the extent possible under law, the author(s) have dedicated all
+# copyright and related and neighboring rights to this software to the
+# public domain worldwide. This software is distributed without any
+# warranty.
+#
+# You should have received a copy of the CC0 Public Domain Dedication
+# along with this software. If not, see
+# <http://creativecommons.org/publicdomain/zero/1.0/>.
+import os
+import pickle
+
+
+class Journal:
+    """Append-only log of a crawl, used to resume it after a crash.
+
+    The file is a sequence of pickled records:
+        ('started', time)               when the crawl started
+        ('cookies', cookies)            session of the first login
+        ('page', kind, url, page)       a fetched page
+        ('frontier', pending, aliases)  checkpoint of the unfetched pages
+        ('done', aliases)               the crawl completed
+
+    Records are flushed to disk every `interval` pages. A record cut off
+    by a crash is dropped when the journal is opened again.
+    """
+
+    def __init__(self, filename, interval=100):
+        self.filename = filename
+        self.interval = interval
+        self.cookies = None
+        self.started = None
+        self.done = False
+        # url -> page, for every page in the journal
+        self.site = {}
+        # (kind, url) of every page, in the order they were fetched
+        self.pages = []
+        # Frontier and aliases as of the last checkpoint
+        self.pending = []
+        self.aliases = {}
+        # Number of entries in self.pages at the last checkpoint
+        self.checkpointed = 0
+        if os.path.exists(filename):
+            self._replay()
+        self.file = open(filename, 'ab')
+        self.unflushed = 0
+
+    def _replay(self):
+        end = 0
+        with open(self.filename, 'rb') as f:
+            while True:
+                try:
+                    record = pickle.load(f)
+                except EOFError:
+                    break
+                except Exception:
+                    print('WARN:\tDropping truncated journal record in:\t',
+                          self.filename)
+                    break
+                end = f.tell()
+                if record[0] == 'page':
+                    _, kind, url, page = record
+                    self.pages.append((kind, url))
+                    self.site[url] = page
+                elif record[0] == 'frontier':
+                    _, self.pending, self.aliases = record
+                    self.checkpointed = len(self.pages)
+                elif record[0] == 'cookies':
+                    self.cookies = record[1]
+                elif record[0] == 'started':
+                    self.started = record[1]
+                elif record[0] == 'done':
+                    self.done = True
+                    _, self.aliases = record
+        os.truncate(self.filename, end)
+
+    # Pages fetched after the last checkpoint, whose links are not in the
+    # checkpointed frontier
+    def get_unexpanded(self):
+        return self.pages[self.checkpointed:]
+
+    def _write(self, record):
+        pickle.dump(record, self.file, pickle.HIGHEST_PROTOCOL)
+
+    def _flush(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unflushed = 0
+
+    def log_started(self, started):
+        self.started = started
+        self._write(('started', started))
+        self._flush()
+
+    def log_cookies(self, cookies):
+        self.cookies = cookies
+        self._write(('cookies', cookies))
+        self._flush()
+
+    def log_page(self, kind, url, page):
+        self._write(('page', kind, url, page))
+        self.unflushed += 1
+
+    def is_due(self):
+        return self.unflushed >= self.interval
+
+    def checkpoint(self, pending, aliases):
+        self._write(('frontier', pending, aliases))
+        self._flush()
+
+    def finish(self, aliases):
+        self.aliases = aliases
+        self._write(('done', aliases))
+        self._flush()
+        self.done = True
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
@@ -0,0 +1,126 @@
+# enjinuity
+# Written in 2016 by David H. Wei <https://github.com/spikeh/>
+#
+# To the extent possible under law, the author(s) have dedicated all
+# copyright and related and neighboring rights to this software to the
+# public domain worldwide. This software is distributed without any
+# warranty.
+#
+# You should have received a copy of the CC0 Public Domain Dedication
+# along with this software. If not, see
+# <http://creativecommons.org/publicdomain/zero/1.0/>.
+import re
+from lxml import etree
+
+
+class Layout:
+    """Where things are in the pages of one version of the Enjin layout.
+
+    Every XPath in `xpaths` and regular expression in `patterns` is
+    compiled once and becomes an attribute named after its key. XPaths
+    return plain strings rather than strings tied to their document.
+    `login` maps the fields of the login form to XPaths for the browser.
+    """
+
+    def __init__(self, version, xpaths, patterns, login):
+        self.version = version
+        for name, path in xpaths.items():
+            setattr(self, name, etree.XPath(path, smart_strings=False))
+        for name, pattern in patterns.items():
+            setattr(self, name, re.compile(pattern))
+        self.login = login
+
+
+enjin_2016 = Layout(1, {
+    # Checks that a page loaded completely, with posts_box and members
+    'forum_cells': '//td[@class="c forum"]',
+    'threads_box': '//div[@class="contentbox threads"]',
+
+    # Forum index, relative to each category and forum
+    'categories': ('//div[contains(@class, "contentbox") and '
+                   'contains(@class, "category")]'),
+    'category_name': 'div[1]/div[3]/span',
+    'category_forums': 'div[2]//td[@class="c forum"]',
+    'forum_link': 'div[1]/a',
+    'forum_desc': 'div[2]',
+
+    # Forum listing, relative to each subforum and thread row
+    'subforums': ('//div[contains(@class, "contentbox") and '
+                  'contains(@class, "subforums-block")]/div[2]'
+                  '//tr[contains(@class, "row")]'),
+    'subforum_link': 'td[2]/div[1]/a',
+    'subforum_desc': 'td[2]/div[2]',
+    'thread_count': ('//div[@class="contentbox threads"]/div[1]'
+                     '/div[@class="text-right"]'),
+    'forum_pages': ('.//div[@class="widgets top"]/div[@class="right"]'
+                    '/div[1]/div[1]/input'),
+    'threads': ('.//div[@class="contentbox threads"]/div[2]'
+                '//tr[contains(@class, "row")]'),
+    'thread_icon': 'td[1]/a/div',
+    'thread_link': ('td[2]/a[contains(@class, "thread-view") and '
+                    'contains(@class, "thread-subject")]'),
+    'thread_views': 'td[contains(@class, "views")]',
+    'thread_replies': 'td[contains(@class, "replies")]',
+    'thread_lastpost': 'td[contains(@class, "lastpost")]',
+    'links': './/a/@href',
+
+    # Thread, relative to the posts box on the first page
+    'posts_box': '//div[@class="contentbox posts"]',
+    'first_posts': 'div[2]//tr[contains(@class, "row")]',
+    'post_count': 'div[1]/div[@class="text-right"]',
+    'thread_flags': 'div[1]/div[3]/span/div[1]/div[1]',
+    'thread_subject': 'div[1]/div[3]/span/h1/text()',
+    'poll': ('.//td[2]/div[@class="post-wrapper"]'
+             '/div[@class="post-poll-area"]'),
+    'thread_pages': ('.//div[@class="widgets top"]/div[@class="right"]'
+                     '/div[1]/span[2]'),
+    'posts': ('.//div[@class="contentbox posts"]/div[2]'
+              '//tr[contains(@class, "row")]'),
+
+    # Poll area
+    'poll_titles': './/div[contains(@class, "answer-title")]',
+    'poll_votes': ('.//div[@class="clabel"]'
+                   '/span[contains(@class, "text-alter")]'),
+    'poll_voters': './/div[@class="number-votes"]/text()',
+    'poll_option': 'div[2]/form/div[1]/div[1]/input',
+
+    # Post row
+    'post_author': 'td[1]/div[@class="cell"]/div[@class="username"]/a',
+    'post_times': 'td[2]/div[2]/div[1]/div[1]',
+    'post_message': 'td[2]/div[1]/div[1]',
+
+    # Member list row and profile
+    'members': './/tr[@class="row"]',
+    'member_pages': ('.//div[@class="widgets top"]/div[@class="right"]'
+                     '/div[1]/div[1]/input'),
+    'member_tags': 'td[contains(@class, "col-tags")]',
+    'member_name': 'td[contains(@class, "col-displayname")]/a',
+    'member_joined': 'td[contains(@class, "col-datejoined")]',
+    'member_lastseen': 'td[contains(@class, "col-lastseen")]',
+    'reputation': '//div[@class="widget_ministats"]/div[3]/h4'
+}, {
+    # Topics · 12 threads
+    'nr_threads': r'\s+·\s+(\d+) threads',
+    # Posted Jan 23, 15 or Last edited Sun at 15:53
+    'time_prefix': r'(?:^Posted|^Last edited) ([\w\s,:]*)',
+    # Jan 23, 15
+    'date': r'\s\d\d$',
+    # 12 hours ago, 5 minutes ago
+    'time_ago': r'^(\d+) (\w+) ago$',
+    # Sun at 03:52 pm or Tue at 21:20
+    'weekday_time': (r'^([a-zA-Z]{3}) at '
+                     r'(?:(?P<half>[\w\s:]+m)$|(?P<full>[\w\s:]+)$)')
+}, {
+    'username': ('//*[@id="section-main"]/div/div[3]/div[2]/div[8]/table'
+                 '/tbody/tr/td/div/div/div/div/table/tbody/tr/td[2]/form'
+                 '/div[2]/input'),
+    'password': ('//*[@id="section-main"]/div/div[3]/div[2]/div[8]/table'
+                 '/tbody/tr/td/div/div/div/div/table/tbody/tr/td[2]/form'
+                 '/div[4]/input'),
+    'submit': ('//*[@id="section-main"]/div/div[3]/div[2]/div[8]/table'
+               '/tbody/tr/td/div/div/div/div/table/tbody/tr/td[2]/form'
+               '/div[5]/div/input')
+})
+
+# The layout of the site being exported
+layout = enjin_2016
@@ -0,0 +1,270 @@
+# enjinuity
+# Written in 2016 by David H. Wei <https://github.com/spikeh/>
+#
+# To the extent possible under law, the author(s) have dedicated all
+# copyright and related and neighboring rights to this software to the
+# public domain worldwide. This software is distributed without any
+# warranty.
+#
+# You should have received a copy of the CC0 Public Domain Dedication
+# along with this software. If not, see
+# <http://creativecommons.org/publicdomain/zero/1.0/>.
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds of the latency buckets, in seconds
+BUCKETS = (0.00001, 0.00003, 0.0001, 0.0003, 0.001, 0.003, 0.01, 0.03, 0.1,
+           0.3, 1, 3, 10, 30, 100)
+
+
+class Histogram:
+    """Counts of observed latencies per bucket, with their sum and max."""
+
+    def __init__(self, counts=None, total=0.0, peak=0.0):
+        self.counts = counts or [0] * (len(BUCKETS) + 1)
+        self.total = total
+        self.peak = peak
+
+    def observe(self, seconds):
+        i = 0
+        while i < len(BUCKETS) and seconds > BUCKETS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.total += seconds
+        if seconds > self.peak:
+            self.peak = seconds
+
+    def merge(self, other):
+        for i, n in enumerate(other.counts):
+            self.counts[i] += n
+        self.total += other.total
+        self.peak = max(self.peak, other.peak)
+
+    # Upper bound of the bucket holding quantile q
+    def quantile(self, q):
+        rank = q * sum(self.counts)
+        if not rank:
+            return 0.0
+        seen = 0
+        for bound, n in zip(BUCKETS, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return self.peak
+
+    def summary(self):
+        count = sum(self.counts)
+        return {
+            'count': count,
+            'sum': self.total,
+            'mean': self.total / count if count else 0.0,
+            'max': self.peak,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+        }
+
+
+class Metrics:
+    """Counters and latency histograms of a run, shared by every stage.
+
+    Stages add to counters and observe latencies by name. A counter that
+    a stage has a total for, set with set_total(), is reported as that
+    stage's progress, with an ETA from its rate so far. Rates are taken
+    between the first and the last time a counter was added to, so rows
+    per second are those of the dump rather than of the whole run.
+
+    start() exports a snapshot every `interval` seconds until stop():
+    JSON, a Prometheus textfile if the filename ends in .prom, or a line
+    of progress on stdout without a filename. Worker processes drain()
+    what they recorded and send it back to be merged into the parent.
+    """
+
+    def __init__(self):
+        self.reset()
+        self.exporter = None
+
+    def reset(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.counters = {}
+        self.first = {}
+        self.last = {}
+        self.histograms = {}
+        # Stage -> (counter, total)
+        self.totals = {}
+
+    def add(self, name, n=1):
+        now = time.time()
+        with self.lock:
+            try:
+                self.counters[name] += n
+            except KeyError:
+                self.counters[name] = n
+                self.first[name] = now
+            self.last[name] = now
+
+    def get(self, name):
+        with self.lock:
+            return self.counters.get(name, 0)
+
+    def observe(self, name, seconds):
+        with self.lock:
+            try:
+                self.histograms[name].observe(seconds)
+            except KeyError:
+                histogram = self.histograms[name] = Histogram()
+                histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def set_total(self, stage, counter, total):
+        with self.lock:
+            self.totals[stage] = (counter, total)
+
+    # What was recorded since the last drain(), to merge() elsewhere
+    def drain(self):
+        with self.lock:
+            state = (self.counters, self.first, self.last,
+                     {name: (h.counts, h.total, h.peak)
+                      for name, h in self.histograms.items()})
+            self.counters = {}
+            self.first = {}
+            self.last = {}
+            self.histograms = {}
+        return state
+
+    def merge(self, state):
+        counters, first, last, histograms = state
+        with self.lock:
+            for name, n in counters.items():
+                self.counters[name] = self.counters.get(name, 0) + n
+                self.first.setdefault(name, first[name])
+                self.last[name] = max(self.last.get(name, 0), last[name])
+            for name, args in histograms.items():
+                histogram = Histogram(*args)
+                if name in self.histograms:
+                    self.histograms[name].merge(histogram)
+                else:
+                    self.histograms[name] = histogram
+
+    def snapshot(self):
+        now = time.time()
+        with self.lock:
+            counters = dict(self.counters)
+            # A counter added to once has no rate yet
+            rates = {}
+            for name, n in counters.items():
+                seconds = self.last[name] - self.first[name]
+                rates[name] = n / seconds if seconds > 0 else 0.0
+            histograms = {name: h.summary()
+                          for name, h in self.histograms.items()}
+            progress = {}
+            for stage, (counter, total) in self.totals.items():
+                done = counters.get(counter, 0)
+                rate = rates.get(counter, 0.0)
+                left = max(total - done, 0)
+                progress[stage] = {
+                    'done': done,
+                    'total': total,
+                    'percent': 100.0 * done / total if total else 100.0,
+                    'eta': left / rate if rate else None,
+                }
+        return {
+            'time': now,
+            'elapsed': now - self.started,
+            'counters': counters,
+            'rates': rates,
+            'histograms': histograms,
+            'progress': progress,
+        }
+
+    def export(self, filename=None):
+        snapshot = self.snapshot()
+        if filename is None:
+            print('INFO:\t' + format_progress(snapshot))
+            return
+        if filename.endswith('.prom'):
+            text = format_prometheus(snapshot)
+        else:
+            text = json.dumps(snapshot, indent=2, sort_keys=True) + '\n'
+        # Readers never see a half written file
+        tmp = filename + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(text)
+        os.replace(tmp, filename)
+
+    def start(self, filename=None, interval=10):
+        self.stop()
+        done = threading.Event()
+
+        def run():
+            while not done.wait(interval):
+                self.export(filename)
+            self.export(filename)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        self.exporter = (thread, done)
+
+    # Stops the exporter after a last export
+    def stop(self):
+        if self.exporter:
+            thread, done = self.exporter
+            done.set()
+            thread.join()
+            self.exporter = None
+
+
+def format_progress(snapshot):
+    parts = []
+    for stage, p in sorted(snapshot['progress'].items()):
+        eta = '?' if p['eta'] is None else '{:.0f}s'.format(p['eta'])
+        parts.append('{} {}/{} ({:.1f}%, ETA {})'.format(
+                stage, p['done'], p['total'], p['percent'], eta))
+    if not parts:
+        parts.append('{} counters'.format(len(snapshot['counters'])))
+    return '{:.0f}s\t'.format(snapshot['elapsed']) + ', '.join(parts)
+
+def _metric_name(name):
+    return 'enjinuity_' + ''.join(c if c.isalnum() else '_' for c in name)
+
+def format_prometheus(snapshot):
+    lines = []
+    for name, n in sorted(snapshot['counters'].items()):
+        metric = _metric_name(name)
+        lines.append('# TYPE {}_total counter'.format(metric))
+        lines.append('{}_total {}'.format(metric, n))
+        lines.append('# TYPE {}_per_second gauge'.format(metric))
+        lines.append('{}_per_second {}'.format(metric,
+                                               snapshot['rates'][name]))
+    for name, h in sorted(snapshot['histograms'].items()):
+        metric = _metric_name(name)
+        lines.append('# TYPE {} summary'.format(metric))
+        for q in ('p50', 'p90', 'p99'):
+            lines.append('{}{{quantile="0.{}"}} {}'.format(metric, q[1:],
+                                                            h[q]))
+        lines.append('{}_sum {}'.format(metric, h['sum']))
+        lines.append('{}_count {}'.format(metric, h['count']))
+    for stage, p in sorted(snapshot['progress'].items()):
+        labels = '{{stage="{}"}}'.format(stage)
+        lines.append('enjinuity_progress_done{} {}'.format(labels, p['done']))
+        lines.append('enjinuity_progress_total{} {}'.format(labels,
+                                                            p['total']))
+        if p['eta'] is not None:
+            lines.append('enjinuity_eta_seconds{} {}'.format(labels,
+                                                            p['eta']))
+    lines.append('enjinuity_elapsed_seconds {}'.format(snapshot['elapsed']))
+    return '\n'.join(lines) + '\n'
+
+# Shared by the whole run
+metrics = Metrics()
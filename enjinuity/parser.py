@@ -10,23 +10,51 @@
 # along with this software. If not, see
 # <http://creativecommons.org/publicdomain/zero/1.0/>.
 import pickle
+from collections.abc import Mapping
+from enjinuity.dump import DumpWriter
+from enjinuity.metrics import metrics
 from enjinuity.objects import EnjinForum
+from enjinuity.sqldump import SqlWriter
 from lxml import html
 
 
 class Parser:
 
-    def __init__(self, url, site, users):
-        if not isinstance(site, dict) and site:
+    def __init__(self, url, site, users, processes=1, now=None,
+                 stream=False):
+        if not isinstance(site, Mapping) and site:
             return ValueError
         elif not isinstance(users, dict) and users:
             return ValueError
 
-        self.forum = EnjinForum(url, site, users)
+        # Relative dates are read as of when the site was scraped, if its
+        # archive says
+        if now is None:
+            now = getattr(site, 'scraped', None)
+        self.forum = EnjinForum(url, site, users, processes, now, stream)
+        self.stream = stream
         self.db = {}
 
     def dump_mybb(self, filename):
-        for table in ['forums', 'threads', 'posts', 'polls', 'pollvotes']:
+        tables = ['forums', 'threads', 'posts', 'polls', 'pollvotes']
+        if self.stream:
+            # Rows are written thread by thread instead of kept in self.db
+            with DumpWriter(filename, tables) as db:
+                self.forum.dump_mybb(db)
+            return
+        for table in tables:
             self.db[table] = []
         self.forum.dump_mybb(self.db)
         pickle.dump(self.db, open(filename, 'wb'))
+        for table, rows in self.db.items():
+            metrics.add('rows.' + table, len(rows))
+
+    # The same rows as dump_mybb(), as a .sql file for mysql or psql
+    def dump_sql(self, filename, dbtype, prefix='', batch_size=1000):
+        with SqlWriter(filename, dbtype, prefix, batch_size) as db:
+            self.forum.dump_mybb(db)
+
+    # {uid: (postnum, threadnum, lastpost)} for Users.dump_mybb(); with
+    # stream, the threads are only counted by dump_mybb()
+    def get_user_counts(self):
+        return self.forum.get_user_counts()
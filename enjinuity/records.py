@@ -0,0 +1,163 @@
+# enjinuity
+# Written in 2016 by David H. Wei <https://github.com/spikeh/>
+#
+# To the extent possible under law, the author(s) have dedicated all
+# copyright and related and neighboring rights to this software to the
+# public domain worldwide. This software is distributed without any
+# warranty.
+#
+# You should have received a copy of the CC0 Public Domain Dedication
+# along with this software. If not, see
+# <http://creativecommons.org/publicdomain/zero/1.0/>.
+import pickle
+from collections import namedtuple
+from enjinuity.layout import layout
+from enjinuity.metrics import metrics
+from lxml import etree, html
+from urllib.parse import urljoin
+
+# Everything the scraper and the object model need from an Enjin page.
+# Lists of (name, desc, url) describe forums, threads are
+# (url, views, sticky, marker) and marker is None if unknown. A post's
+# message is its element, or the element as HTML in a stored record.
+IndexPage = namedtuple('IndexPage', 'categories')
+CategoryRecord = namedtuple('CategoryRecord', 'name forums')
+ForumPage = namedtuple('ForumPage', 'subforums nr_threads threads pages')
+ThreadPage = namedtuple('ThreadPage',
+                        'reply_cnt subject locked poll posts pages')
+PollRecord = namedtuple('PollRecord', 'results total_voters multiple')
+PostRecord = namedtuple('PostRecord', 'author times message')
+
+# Records are stored pickled, pages as HTML which never starts like this
+PICKLE_MARK = b'\x80'
+
+def dump_record(record):
+    # Post bodies are read as elements of the page and stored as HTML
+    if isinstance(record, ThreadPage) and record.posts:
+        posts = [p._replace(message=etree.tostring(p.message, encoding=str))
+                 if etree.iselement(p.message) else p for p in record.posts]
+        record = record._replace(posts=posts)
+    return pickle.dumps(record, pickle.HIGHEST_PROTOCOL)
+
+def read_page(page, base_url, reader, *args):
+    if isinstance(page, bytes) and page.startswith(PICKLE_MARK):
+        return pickle.loads(page)
+    return reader(html.fromstring(page, base_url), *args)
+
+def get_record(site, url, reader, *args):
+    metrics.add('pages_parsed')
+    return read_page(site[url], urljoin(url, '/'), reader, *args)
+
+# Whether a stored page is a forum listing, without parsing HTML pages
+def is_forum_page(page):
+    if page.startswith(PICKLE_MARK):
+        return isinstance(pickle.loads(page), ForumPage)
+    return b'contentbox threads' in page
+
+def read_index(page):
+    categories = []
+    for c in layout.categories(page):
+        name = layout.category_name(c)[0].text.strip()
+        forums = []
+        for f in layout.category_forums(c):
+            name_elem = layout.forum_link(f)[0]
+            forums.append((name_elem.text.strip(),
+                           layout.forum_desc(f)[0].text.strip(),
+                           urljoin(page.base_url, name_elem.get('href'))))
+        categories.append(CategoryRecord(name, forums))
+    return IndexPage(categories)
+
+def read_thread_marker(row):
+    # The reply count and the link to the last post both change when
+    # someone posts in the thread; the view count changes on every visit
+    replies = layout.thread_replies(row)
+    lastpost = layout.thread_lastpost(row)
+    if not len(replies) or not len(lastpost):
+        return None
+    links = layout.links(lastpost[0])
+    last = links[-1] if links else lastpost[0].text_content().strip()
+    return (replies[0].text_content().strip(), last)
+
+def read_forum_page(page, first=True):
+    subforums = []
+    nr_threads = None
+    pages = 1
+    if first:
+        for sf in layout.subforums(page):
+            sf_name_elem = layout.subforum_link(sf)[0]
+            subforums.append((sf_name_elem.text.strip(),
+                              layout.subforum_desc(sf)[0].text.strip(),
+                              urljoin(page.base_url,
+                                      sf_name_elem.get('href'))))
+
+        nr_threads = layout.thread_count(page)[0]
+        nr_threads = int(layout.nr_threads.split(
+                nr_threads.text_content().strip())[1])
+
+        nr_pages = layout.forum_pages(page)
+        if len(nr_pages):
+            pages = int(nr_pages[0].get('maxlength'))
+
+    threads = []
+    for t in layout.threads(page):
+        # Ignore threads that are marked as 'moved', since we'll pick
+        # them up from their destination
+        if 'moved' in t.get('class').split(' '):
+            continue
+        t_icons = layout.thread_icon(t)[0].get('class').split(' ')
+        t_sticky = 1 if 'sticky' in t_icons else 0
+        t_name = layout.thread_link(t)[0]
+        t_url = urljoin(page.base_url, t_name.get('href'))
+        t_views = layout.thread_views(t)[0].text.strip()
+        threads.append((t_url, t_views, t_sticky, read_thread_marker(t)))
+    return ForumPage(subforums, nr_threads, threads, pages)
+
+def read_poll(elem):
+    polls_title = layout.poll_titles(elem)
+    polls_votes = layout.poll_votes(elem)
+    total_voters = int(layout.poll_voters(elem)[1].strip())
+    poll_option_type = layout.poll_option(elem)[0].get('type')
+    multiple = 1 if poll_option_type == "checkbox" else 0
+    results = [(titles.text_content(), votes.text_content().split(' ')[0])
+               for titles, votes in zip(polls_title, polls_votes)]
+    return PollRecord(results, total_voters, multiple)
+
+def read_post(elem):
+    author = layout.post_author(elem)[0].text_content()
+    # Posted Jan 23, 15 · OP · Last edited Apr 29, 16
+    # Posted Sun at 03:52 pm · Last edited Sun at 15:53
+    times = [x.strip() for x in
+             layout.post_times(elem)[0].text_content().split('·')]
+    msg_elem = layout.post_message(elem)[0]
+    return PostRecord(author, times, msg_elem)
+
+def read_thread_page(page, first=True, posts=True):
+    reply_cnt = None
+    subject = None
+    locked = None
+    poll = None
+    pages = 1
+    if first:
+        posts_elem = layout.posts_box(page)[0]
+        rows = layout.first_posts(posts_elem)
+        reply_cnt = int(layout.post_count(posts_elem)[0]
+                        .text_content().strip().split(' ')[0])
+
+        poll_block = layout.poll(page)
+        if len(poll_block):
+            poll = read_poll(poll_block[0])
+
+        flags = layout.thread_flags(posts_elem)[0]
+        locked = 1 if 'locked' in flags.get('class').split(' ') else 0
+
+        subject = ''.join([x.strip() for x in
+                           layout.thread_subject(posts_elem)])
+
+        nr_pages = layout.thread_pages(page)
+        if len(nr_pages):
+            pages = int(nr_pages[0].text_content().split(' ')[1])
+    else:
+        rows = layout.posts(page)
+
+    post_records = [read_post(p) for p in rows] if posts else None
+    return ThreadPage(reply_cnt, subject, locked, poll, post_records, pages)
@@ -9,151 +9,394 @@
 # You should have received a copy of the CC0 Public Domain Dedication
 # along with this software. If not, see
 # <http://creativecommons.org/publicdomain/zero/1.0/>.
-import pickle
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from enjinuity.archive import Archive
+from enjinuity.fetcher import BrowserFetcher, HttpFetcher
+from enjinuity.frontier import (INDEX, FORUM, FORUM_PAGE, THREAD,
+                                THREAD_PAGE, Frontier, normalize_url)
+from enjinuity.journal import Journal
+from enjinuity.layout import layout
+from enjinuity.metrics import metrics
+from enjinuity.records import (dump_record, is_forum_page, read_forum_page,
+                               read_index, read_page, read_thread_page)
 from lxml import html
-from selenium import webdriver
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlsplit
+
+def has_forums(elem):
+    return len(layout.forum_cells(elem)) > 0
+
+def has_threads(elem):
+    return len(layout.threads_box(elem)) > 0
+
+def has_posts(elem):
+    return len(layout.posts_box(elem)) > 0
 
 
 class Scraper:
 
-    def __init__(self, url, usr, pwd, debug=False):
+    def __init__(self, url, usr, pwd, debug=False, workers=1,
+                 backend='browser', max_per_host=None, journal=None,
+                 checkpoint=100, previous=None, archive=None, records=False):
         self.url = url
         self.debug = debug
         self.base_url = urljoin(url, '/')
-        self.site = {}
+        # Pages are written to the archive file as they are fetched
+        self.archive = archive
+        self.site = Archive(archive, 'a') if archive else {}
+        # Store extracted records instead of the HTML of each page
+        self.records = records
+        self.frontier = Frontier()
+        # URL -> URL it is a duplicate of, filled in once the crawl is done
+        self.aliases = {}
+        self.max_per_host = max_per_host or max(1, workers)
+        # (kind, url) of pages being fetched right now
+        self.inflight = set()
+        self.errors = []
+        self.failed = []
+        self.browsers = []
+        # Site of an earlier crawl to take unchanged threads from
+        self.previous = previous
+        # Normalized thread URL -> (URL, marker) in the previous site
+        self.markers = None
+        self.reused = 0
+        # Relative dates on the pages are read as of the start of the
+        # crawl, which a resumed crawl takes from its journal
+        self.started = datetime.now(tz=timezone.utc)
 
-        self.browser = webdriver.PhantomJS()
-        self._login(usr, pwd)
-        self._print_debug('INFO:\tSuccessfully logged in.')
+        self.journal = None
+        if journal:
+            self.journal = Journal(journal, checkpoint)
+            if self.journal.started:
+                self.started = self.journal.started
+            else:
+                self.journal.log_started(self.started)
+        if archive and self.site.scraped is None:
+            self.site.set_scraped(self.started)
+        if self.journal:
+            if self.journal.done:
+                print('INFO:\tCrawl already completed in:\t', journal)
+                # The archive already has the aliases linked in
+                if archive:
+                    self.site.close()
+                    self.site = Archive(archive)
+                else:
+                    self.site = self.journal.site
+                    self.aliases = self.journal.aliases
+                    self._link_aliases()
+                self.journal.close()
+                return
 
-        self.browser.get(url)
-        main_elem = html.fromstring(self.browser.page_source, self.base_url)
-        self.site[url] = html.tostring(main_elem)
+        workers = max(1, workers)
+        if backend == 'browser':
+            # One logged in browser session per worker
+            for _ in range(workers):
+                fetcher = BrowserFetcher(self.base_url)
+                self.browsers.append(fetcher)
+                self._start_session(fetcher, usr, pwd)
+            self.fetchers = self.browsers
+        elif backend == 'http':
+            # Log in once, then share the session cookies with a pooled
+            # HTTP client. The browser is kept around as the fallback.
+            fetcher = BrowserFetcher(self.base_url)
+            self.browsers.append(fetcher)
+            self._start_session(fetcher, usr, pwd)
+            http = HttpFetcher.from_browser(fetcher, pool_size=workers)
+            self.fetchers = [http] * workers
+        else:
+            raise ValueError('Unknown backend {}'.format(backend))
+        self._print_debug('INFO:\tSuccessfully logged in.')
 
-        forums = main_elem.xpath('//td[@class="c forum"]')
-        if len(forums):
-            urls = [urljoin(self.base_url, e.xpath('div[1]/a')[0].get('href'))
-                    for e in forums]
-            for f_url in urls:
-                self._scrape_forum(f_url)
+        if self.journal and self.journal.pages:
+            self._resume()
         else:
-            raise ValueError('Could not find forums in ', self.url)
+            self._push(INDEX, url)
+        self._crawl()
 
     def __del__(self):
-        if self.browser:
-            self.browser.quit()
+        for fetcher in getattr(self, 'browsers', []):
+            fetcher.quit()
 
     def _print_debug(self, *args):
         if self.debug:
             print(*args)
 
-    def _login(self, usr, pwd):
+    def _login(self, browser, usr, pwd):
         login_url = urljoin(self.url, '/login')
-        self.browser.get(login_url)
-        username = self.browser.find_element_by_xpath(
-                ('//*[@id="section-main"]/div/div[3]/div[2]/div[8]/table/tbody'
-                 '/tr/td/div/div/div/div/table/tbody/tr/td[2]/form/div[2]'
-                 '/input'))
-        password = self.browser.find_element_by_xpath(
-                ('//*[@id="section-main"]/div/div[3]/div[2]/div[8]/table/tbody'
-                 '/tr/td/div/div/div/div/table/tbody/tr/td[2]/form/div[4]/'
-                 'input'))
+        browser.get(login_url)
+        username = browser.find_element_by_xpath(layout.login['username'])
+        password = browser.find_element_by_xpath(layout.login['password'])
         username.send_keys(usr)
         password.send_keys(pwd)
-        submit = self.browser.find_element_by_xpath(
-                ('//*[@id="section-main"]/div/div[3]/div[2]/div[8]/table/tbody'
-                 '/tr/td/div/div/div/div/table/tbody/tr/td[2]/form/div[5]/div'
-                 '/input'))
+        submit = browser.find_element_by_xpath(layout.login['submit'])
         submit.click()
 
-    def _scrape_thread(self, t_url, is_front=True):
-        if t_url in self.site:
-            print('WARN:\tAlready added thread:\t', t_url)
-        self.browser.get(t_url)
-        elem = html.fromstring(self.browser.page_source, self.base_url)
-        self._print_debug('INFO:\tScraping thread:\t', elem.find('.//title').text)
-        posts = elem.xpath('//div[@class="contentbox posts"]')
-        attempts = 0
-        while len(posts) == 0:
-            if attempts == 2:
-                print('ERROR:\tGiving up on:\t', t_url)
-                return
-            print('Could not find posts in:\t', t_url)
-            self.browser.get(t_url)
-            elem = html.fromstring(self.browser.page_source, self.base_url)
-            posts = elem.xpath('//div[@class="contentbox posts"]')
-            attempts += 1
-        self.site[t_url] = html.tostring(elem)
-
-        if not is_front:
-            return
+    def _start_session(self, fetcher, usr, pwd):
+        browser = fetcher.get_browser()
+        if self.journal and self.journal.cookies:
+            # Reuse the session of the first login instead of logging in
+            browser.get(self.base_url)
+            for cookie in self.journal.cookies:
+                browser.add_cookie(cookie)
+        else:
+            self._login(browser, usr, pwd)
+            if self.journal:
+                self.journal.log_cookies(browser.get_cookies())
+
+    def _resume(self):
+        # With an archive the journal only lists the pages, the archive
+        # holds them
+        if not self.archive:
+            self.site.update(self.journal.site)
+        self.journal.site = {}
+        self.aliases.update(self.journal.aliases)
+        for kind, url in self.journal.pages:
+            if url in self.site:
+                self.frontier.mark(url)
+        for kind, url in self.journal.pending:
+            self.frontier.push(kind, url)
+        # Links on pages fetched since the last checkpoint were never
+        # saved, so find them again from the stored pages. Pages that did
+        # not make it to the archive are fetched again.
+        for kind, url in self.journal.get_unexpanded():
+            if url in self.site:
+                self._expand(kind, url, read_page(
+                        self.site[url], self.base_url, self._read, kind))
+            else:
+                self.frontier.push(kind, url)
+        print('INFO:\tResuming crawl with', len(self.journal.pages),
+              'pages fetched and', len(self.frontier), 'pending.')
+
+    def _crawl(self):
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self._schedule(loop))
+        finally:
+            loop.close()
+        self._link_aliases()
+        if self.archive:
+            # Write the index and reopen the archive memory-mapped
+            self.site.close()
+            self.site = Archive(self.archive)
+        if self.journal:
+            if self.errors:
+                # Retry the failed pages when the crawl is resumed
+                self.journal.checkpoint(self.failed, self.aliases)
+            else:
+                self.journal.finish(self.aliases)
+            self.journal.close()
+        if self.previous is not None:
+            print('INFO:\tReused', self.reused,
+                  'unchanged threads from the previous site.')
+        if self.errors:
+            raise self.errors[0]
+
+    # Every URL a page was reached by is in the site
+    def _link_aliases(self):
+        for alias, url in self.aliases.items():
+            if url in self.site:
+                if self.archive:
+                    self.site.link(alias, url)
+                else:
+                    self.site[alias] = self.site[url]
+
+    def _index_previous(self):
+        self.markers = {}
+        for url, page in self.previous.items():
+            # Only forum listings have thread rows, skip the rest unparsed
+            if not is_forum_page(page):
+                continue
+            record = read_page(page, self.base_url, read_forum_page, False)
+            for t_url, _, _, marker in record.threads:
+                self.markers[normalize_url(t_url)] = (t_url, marker)
+
+    # Copy a thread that has not changed since the previous site
+    def _reuse(self, thread, t_url):
+        if self.previous is None or t_url in self.frontier:
+            return False
+        if self.markers is None:
+            self._index_previous()
+        marker = thread[3]
+        old_url, old_marker = self.markers.get(normalize_url(t_url),
+                                               (None, None))
+        if marker is None or marker != old_marker:
+            return False
+        if old_url not in self.previous:
+            return False
+        pages = [(THREAD, t_url, self.previous[old_url])]
+        nr_pages = read_page(self.previous[old_url], self.base_url,
+                             read_thread_page, True, False).pages
+        for i in range(2, nr_pages + 1):
+            old_page = "{}/page/{}".format(old_url, i)
+            if old_page not in self.previous:
+                return False
+            pages.append((THREAD_PAGE, "{}/page/{}".format(t_url, i),
+                          self.previous[old_page]))
+        for kind, url, page in pages:
+            self.frontier.mark(url)
+            self.site[url] = page
+            self._log_page(kind, url)
+        self.reused += 1
+        metrics.add('threads_reused')
+        return True
+
+    async def _schedule(self, loop):
+        # Pages are fetched in a thread per fetcher, everything else
+        # happens on the event loop, so the frontier needs no locking.
+        executor = ThreadPoolExecutor(len(self.fetchers))
+        idle = list(reversed(self.fetchers))
+        limits = {}
+        running = set()
+        try:
+            while len(self.frontier) or running:
+                while len(self.frontier) and idle:
+                    kind, url = self.frontier.pop()
+                    self.inflight.add((kind, url))
+                    running.add(loop.create_task(self._visit(
+                            loop, executor, idle.pop(), limits, kind, url)))
+                # The total grows as links are found
+                metrics.set_total('crawl', 'pages_crawled',
+                                  metrics.get('pages_crawled') +
+                                  len(self.frontier) + len(self.inflight))
+                done, running = await asyncio.wait(
+                        running, return_when=asyncio.FIRST_COMPLETED)
+                idle.extend(task.result() for task in done)
+                if self.journal and self.journal.is_due():
+                    pending = list(self.inflight) + self.frontier.pending()
+                    if self.archive:
+                        # Pages must be on disk before the journal says so
+                        self.site.flush()
+                    self.journal.checkpoint(pending, self.aliases)
+        finally:
+            executor.shutdown()
+
+    async def _visit(self, loop, executor, fetcher, limits, kind, url):
+        host = urlsplit(url).hostname
+        if host not in limits:
+            limits[host] = asyncio.Semaphore(self.max_per_host)
+        try:
+            async with limits[host]:
+                record = await loop.run_in_executor(
+                        executor, self._fetch, fetcher, kind, url)
+            if record is not None:
+                self._expand(kind, url, record)
+                self._log_page(kind, url)
+            metrics.add('pages_crawled')
+        except Exception as e:
+            metrics.add('crawl_errors')
+            print('ERROR:\tFailed on:\t', url, e)
+            self.errors.append(e)
+            self.failed.append((kind, url))
+        finally:
+            self.inflight.discard((kind, url))
+        return fetcher
 
-        pages = elem.xpath(
-                ('.//div[@class="widgets top"]/div[@class="right"]/div[1]/'
-                 'span[2]'))
-        if len(pages):
-            nr_pages = int(pages[0].text.split(' ')[1])
-            for i in range(2, nr_pages + 1):
-                next_url = "{}/page/{}".format(t_url, i)
-                self._scrape_thread(next_url, False)
-
-    def _scrape_threads(self, elem, f_url):
-        threads = elem.xpath(
-                ('.//div[@class="contentbox threads"]/div[2]'
-                 '//tr[contains(@class, "row")]'))
-        if len(threads):
-            self._print_debug('INFO:\tScraping forum:\t\t', elem.find('.//title').text)
-            urls = [urljoin(self.base_url, e.xpath(
-                    ('td[2]/a[contains(@class, "thread-view") and '
-                     'contains(@class, "thread-subject")]'))[0].get('href'))
-                    for e in threads]
-            for u in urls:
-                self._scrape_thread(u, True)
+    def _log_page(self, kind, url):
+        if self.journal:
+            page = None if self.archive else self.site[url]
+            self.journal.log_page(kind, url, page)
+
+    def _push(self, kind, url):
+        if kind == FORUM and urljoin(url, '/') != self.base_url:
+            print('WARN:\tSkipping external link:\t', url)
+        elif not self.frontier.push(kind, url):
+            canonical = self.frontier.canonical(url)
+            if canonical != url:
+                self.aliases[url] = canonical
+            elif kind in (FORUM, FORUM_PAGE):
+                print('WARN:\tAlready added forum:\t', url)
+            else:
+                print('WARN:\tAlready added thread:\t', url)
+
+    def _fetch(self, fetcher, kind, url):
+        if kind == INDEX:
+            elem = fetcher.get(url, has_forums)
+        elif kind in (FORUM, FORUM_PAGE):
+            elem = fetcher.get(url, has_threads)
         else:
-            print('WARN:\tNo threads in forum:\t', elem.find('.//title').text)
-            print(f_url)
-            return
+            elem = fetcher.get(url, has_posts)
+            attempts = 0
+            while not has_posts(elem):
+                if attempts == 2:
+                    print('ERROR:\tGiving up on:\t', url)
+                    return None
+                metrics.add('fetch_retries')
+                elem = fetcher.get(url, has_posts)
+                attempts += 1
+        record = self._read(elem, kind)
+        if self.records:
+            self.site[url] = dump_record(record)
+        else:
+            self.site[url] = html.tostring(elem)
+        return record
 
-    def _scrape_forum(self, f_url):
-        if urljoin(f_url, '/') != self.base_url:
-            print('WARN:\tSkipping external link:\t', f_url)
-            return
-        elif f_url in self.site:
-            print('WARN:\tAlready added forum:\t', f_url)
-            return
-        self.browser.get(f_url)
-        elem = html.fromstring(self.browser.page_source, self.base_url)
-        self.site[f_url] = html.tostring(elem)
-
-        forums = elem.xpath(
-                ('//div[contains(@class, "contentbox") and '
-                 'contains(@class, "subforums-block")]/div[2]'
-                 '//tr[contains(@class, "row")]'))
-        if len(forums):
-            urls = [urljoin(self.base_url,
-                    e.xpath('td[2]/div[1]/a')[0].get('href')) for e in forums]
-            for sf_url in urls:
-                self._scrape_forum(sf_url)
-
-        self._scrape_threads(elem, f_url)
-
-        pages = elem.xpath(
-                ('.//div[@class="widgets top"]/div[@class="right"]'
-                 '/div[1]/div[1]/input'))
-        if len(pages):
-            nr_pages = int(pages[0].get('maxlength'))
-            print(elem.find('.//title').text, 'has', nr_pages, 'pages.')
-            for i in range(2, nr_pages + 1):
-                next_url = "{}/page/{}".format(f_url, i)
-                self.browser.get(next_url)
-                next_page = html.fromstring(self.browser.page_source,
-                                            self.base_url)
-                self.site[next_url] = html.tostring(next_page)
-                self._scrape_threads(next_page, next_url)
+    # The same extraction the object model does, so that records can be
+    # stored instead of pages. Posts are only read when they are stored.
+    def _read(self, elem, kind):
+        if kind == INDEX:
+            return read_index(elem)
+        elif kind == FORUM:
+            return read_forum_page(elem)
+        elif kind == FORUM_PAGE:
+            return read_forum_page(elem, False)
+        elif kind == THREAD:
+            return read_thread_page(elem, True, self.records)
+        else:
+            return read_thread_page(elem, False, self.records)
+
+    def _expand(self, kind, url, record):
+        if kind == INDEX:
+            self._scrape_index(record)
+        elif kind == FORUM:
+            self._scrape_forum(record, url)
+        elif kind == FORUM_PAGE:
+            self._scrape_threads(record, url)
+        elif kind == THREAD:
+            self._scrape_thread(record, url)
+
+    def _scrape_index(self, record):
+        urls = [f[2] for c in record.categories for f in c.forums]
+        if len(urls):
+            for f_url in urls:
+                self._push(FORUM, f_url)
+        else:
+            raise ValueError('Could not find forums in ', self.url)
+
+    def _scrape_thread(self, record, t_url):
+        self._print_debug('INFO:\tScraping thread:\t', record.subject)
+        for i in range(2, record.pages + 1):
+            self._push(THREAD_PAGE, "{}/page/{}".format(t_url, i))
+
+    def _scrape_threads(self, record, f_url):
+        if len(record.threads):
+            self._print_debug('INFO:\tScraping forum:\t\t', f_url)
+            for thread in record.threads:
+                if not self._reuse(thread, thread[0]):
+                    self._push(THREAD, thread[0])
+        else:
+            print('WARN:\tNo threads in forum:\t', f_url)
+
+    def _scrape_forum(self, record, f_url):
+        # Queue the other pages of this forum straight away
+        if record.pages > 1:
+            for i in range(2, record.pages + 1):
+                self._push(FORUM_PAGE, "{}/page/{}".format(f_url, i))
+
+        for _, _, sf_url in record.subforums:
+            self._push(FORUM, sf_url)
+
+        self._scrape_threads(record, f_url)
 
     def get_site(self):
         return self.site
 
     def dump(self, filename):
-        pickle.dump(self.site, open(filename, 'wb'))
+        if self.archive and os.path.abspath(filename) == os.path.abspath(
+                self.archive):
+            return
+        with Archive(filename, 'w') as archive:
+            archive.set_scraped(self.started)
+            for url, page in self.site.items():
+                archive[url] = page
@@ -0,0 +1,178 @@
+# enjinuity
+# Written in 2016 by David H. Wei <https://github.com/spikeh/>
+#
+# To the extent possible under law, the author(s) have dedicated all
+# copyright and related and neighboring rights to this software to the
+# public domain worldwide. This software is distributed without any
+# warranty.
+#
+# You should have received a copy of the CC0 Public Domain Dedication
+# along with this software. If not, see
+# <http://creativecommons.org/publicdomain/zero/1.0/>.
+import gzip
+from enjinuity.metrics import metrics
+
+# Autoincremented column of each MyBB table, for resetting its sequence
+primary_keys = {
+    'forums': 'fid',
+    'threads': 'tid',
+    'posts': 'pid',
+    'polls': 'pid',
+    'pollvotes': 'vid',
+    'users': 'uid',
+    'reputation': 'rid'
+}
+
+# String literals as mysqldump writes them
+mysql_escapes = str.maketrans({
+    '\\': '\\\\',
+    '\'': '\\\'',
+    '\0': '\\0',
+    '\n': '\\n',
+    '\r': '\\r',
+    '\x1a': '\\Z'
+})
+
+# With standard_conforming_strings, only quotes are escaped; text cannot
+# hold NUL, so it is dropped
+pgsql_escapes = str.maketrans({'\'': '\'\'', '\0': None})
+
+# No ALTER TABLE ... DISABLE KEYS: it would commit the transaction, and
+# InnoDB ignores it anyway
+mysql_header = [
+    'SET NAMES utf8;',
+    'SET @OLD_UNIQUE_CHECKS=@@UNIQUE_CHECKS, UNIQUE_CHECKS=0;',
+    'SET @OLD_FOREIGN_KEY_CHECKS=@@FOREIGN_KEY_CHECKS, FOREIGN_KEY_CHECKS=0;',
+    'SET @OLD_SQL_MODE=@@SQL_MODE, SQL_MODE=\'NO_AUTO_VALUE_ON_ZERO\';',
+    'SET autocommit=0;'
+]
+
+mysql_footer = [
+    'COMMIT;',
+    'SET SQL_MODE=@OLD_SQL_MODE;',
+    'SET FOREIGN_KEY_CHECKS=@OLD_FOREIGN_KEY_CHECKS;',
+    'SET UNIQUE_CHECKS=@OLD_UNIQUE_CHECKS;'
+]
+
+pgsql_header = [
+    '\\set ON_ERROR_STOP on',
+    'SET client_encoding = \'UTF8\';',
+    'SET standard_conforming_strings = on;',
+    'BEGIN;',
+    'SET LOCAL synchronous_commit = off;'
+]
+
+pgsql_footer = [
+    'COMMIT;'
+]
+
+
+class SqlTable:
+    """Rows of one table, written out as an INSERT whenever `size` of
+    them are waiting."""
+
+    def __init__(self, writer, table, size):
+        self.writer = writer
+        self.table = table
+        self.size = size
+        self.rows = []
+
+    def append(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.size:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.writer.write_insert(self.table, self.rows)
+            self.rows = []
+
+
+class SqlWriter:
+    """Writes database rows to a .sql file for mysql or psql.
+
+    Rows are appended to db[table] as with a dict of lists, and are
+    written as multi-row INSERTs of up to `batch_size` rows, so only one
+    INSERT per table is held in memory. Table names get `prefix`, and a
+    filename ending in .gz is compressed. The whole file is one
+    transaction, with key checks off for MySQL, and PostgreSQL sequences
+    are moved past the inserted keys at the end.
+    """
+
+    def __init__(self, filename, dbtype, prefix='', batch_size=1000):
+        if dbtype == 'mysql':
+            self.escapes = mysql_escapes
+            header = mysql_header
+        elif dbtype == 'pgsql':
+            self.escapes = pgsql_escapes
+            header = pgsql_header
+        else:
+            raise ValueError('Unknown database type {}'.format(dbtype))
+        self.dbtype = dbtype
+        self.prefix = prefix
+        self.batch_size = batch_size
+        if filename.endswith('.gz'):
+            # Level 6 compresses nearly as well as 9 in half the time
+            self.file = gzip.open(filename, 'wt', compresslevel=6,
+                                  encoding='utf-8', newline='\n')
+        else:
+            self.file = open(filename, 'w', encoding='utf-8', newline='\n')
+        self.file.write('\n'.join(header) + '\n\n')
+        self.tables = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        # A failed export leaves the file without its COMMIT
+        if exc_type is None:
+            self.close()
+        else:
+            self.file.close()
+
+    def __getitem__(self, table):
+        try:
+            return self.tables[table]
+        except KeyError:
+            rows = self.tables[table] = SqlTable(self, table,
+                                                 self.batch_size)
+            return rows
+
+    def literal(self, value):
+        if value is None:
+            return 'NULL'
+        if isinstance(value, str):
+            return '\'' + value.translate(self.escapes) + '\''
+        return str(value)
+
+    def write_insert(self, table, rows):
+        literal = self.literal
+        values = ',\n'.join(['(' + ','.join([literal(v) for v in row]) + ')'
+                             for row in rows])
+        self.file.write('INSERT INTO {}{} VALUES\n{};\n'.format(
+                self.prefix, table, values))
+        metrics.add('rows.' + table, len(rows))
+
+    # Rows waiting for a full INSERT stay buffered
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        if self.file.closed:
+            return
+        for rows in self.tables.values():
+            rows.flush()
+        footer = []
+        for table in self.tables:
+            name = self.prefix + table
+            if self.dbtype == 'pgsql' and table in primary_keys:
+                footer.append(
+                        ('SELECT setval(pg_get_serial_sequence(\'{0}\', '
+                         '\'{1}\'), MAX({1})) FROM {0} HAVING MAX({1}) IS '
+                         'NOT NULL;').format(name, primary_keys[table]))
+        if self.dbtype == 'mysql':
+            footer.extend(mysql_footer)
+        else:
+            footer.extend(pgsql_footer)
+        self.file.write('\n' + '\n'.join(footer) + '\n')
+        self.file.close()
@@ -0,0 +1,177 @@
+# enjinuity
+# Written in 2016 by David H. Wei <https://github.com/spikeh/>
+# and Italo Cotta <https://github.com/itcotta/>
+#
+# To the extent possible under law, the author(s) have dedicated all
+# copyright and related and neighboring rights to this software to the
+# public domain worldwide. This software is distributed without any
+# warranty.
+#
+# You should have received a copy of the CC0 Public Domain Dedication
+# along with this software. If not, see
+# <http://creativecommons.org/publicdomain/zero/1.0/>.
+#
+# Throughput of the BBCode converter against the recursive formatter it
+# replaced, on a mix of typical post bodies:
+#
+#     python -m enjinuity.test.bench_bbcode [-n MESSAGES] [-r REPEAT]
+import argparse
+import random
+import timeit
+from enjinuity.bbcode import fontpx_map, mybb
+from enjinuity.test.generator import snippets
+from lxml import etree, html
+
+# The recursive formatter, kept as the reference the converter must match
+# in test_bbcode
+def legacy_parse_message(tree, func, *args, **kwargs):
+    result = []
+    for e in tree.xpath('child::node()'):
+        if isinstance(e, html.HtmlElement):
+            children = legacy_parse_message(e, func, *args, **kwargs)
+            child_result = func(e, children, *args, **kwargs)
+            if child_result:
+                result.append(child_result)
+        elif isinstance(e, etree._ElementUnicodeResult):
+            result.append(e)
+    return ''.join(result).strip()
+
+def legacy_formatter(element, children):
+    if element.tag == 'br':
+        return '\r'
+    if element.tag == 'a':
+        if children:
+            url = element.get('href')
+            return "[url={link}]{text}[/url]".format(link=url, text=children)
+        # Empty link
+        else:
+            return ''
+    if element.tag == 'img':
+        if element.get('class') == 'bbcode_smiley':
+            return element.get('title')
+        else:
+            return "[img]{link}[/img]".format(link=element.get('src'))
+    if element.tag in ['b', 'strong']:
+        return "[b]{text}[/b]".format(text=children)
+    if element.tag in ['em', 'i']:
+        return "[i]{text}[/i]".format(text=children)
+    if element.tag in ['del', 's']:
+        return "[s]{text}[/s]".format(text=children)
+    if element.tag == 'u':
+        return "[u]{text}[/u]".format(text=children)
+    if element.tag == 'title':
+        return ''
+    if element.tag == 'span':
+        style_list = element.get('style')
+        if not style_list:
+            return children
+        if 'font-size' in style_list:
+            size = style_list.split(':')[1]
+            return "[size={size}]{text}[/size]".format(text=children,
+                                                       size=fontpx_map[size])
+        elif 'color' in style_list:
+            hexcolor = style_list.split('#')[1]
+            return "[color=#{color}]{text}[/color]".format(text=children,
+                                                           color=hexcolor)
+    if (element.tag =='param' and element.get('name') == 'movie' and
+            "youtube" in element.get('value')):
+        firstSplit = element.get('value').split('&')
+        secondSplit = firstSplit[0].split('/')
+        return ("[video=youtube]http://youtube.com/watch?v={value}"
+                "[/video]").format(value=secondSplit[4])
+    # Numered list
+    if element.tag == 'ol':
+        return "[list=1]{text}[/list]".format(text=children)
+    # Bullet list
+    if element.tag == 'ul':
+        return "[list]{text}[/list]".format(text=children)
+    # List item
+    if element.tag == 'li':
+        return "[*]{text}".format(text=children)
+    if element.tag == 'strike':
+        return "[s]{text}[/s]".format(text=children)
+    if element.tag == 'div':
+        elem_classes = element.get('class').split(' ')
+        if 'bbcode_code_body' in elem_classes:
+            return "[code]{text}[/code]".format(text=children)
+        # Ignore unnecessary elements related to quote/code
+        if 'bbcode_code_head' in elem_classes:
+            return ''
+        if 'bbcode_quote_decorator' in elem_classes:
+            return ''
+        elif 'element_avatar' in elem_classes:
+            return ''
+        elif 'user' in elem_classes:
+            return ''
+        # Ignore unnecessary elements related to spoiler tags
+        elif 'spoiler-title' in elem_classes:
+            return ''
+        if 'bbcode' in elem_classes and 'spoiler' in elem_classes:
+            return "[spoiler]{}[/spoiler]".format(children)
+        if 'bbcode_quote' in elem_classes:
+            quotes = list(element)
+            quote_head = quotes[1]
+            who = quote_head.find('div[2]/a')
+            # Properly formatted quote block, with a linked author
+            if who is not None:
+                who = who.text
+                txt = children.split('wrote:')[-1]
+                return "[quote='{}']\r{}\r[/quote]\r\r".format(who, txt)
+            else:
+                child_split = children.strip().split('wrote:')
+                if len(child_split) == 1:
+                    child_split = children.strip().split('Quote:')
+                child_split = [x.strip() for x in child_split]
+                # Text on both sides of 'wrote:'
+                if len(child_split) == 2 and child_split[0] and child_split[1]:
+                    who = child_split[0]
+                    txt = child_split[1]
+                    return "[quote='{}']\r{}\r[/quote]\r\r".format(who, txt)
+                else:
+                    txt = ''.join(child_split)
+                    return "[quote]\r{}\r[/quote]\r\r".format(txt)
+        if element.get('style') == 'text-align:center':
+            return "[align=center]{text}[/align]".format(text=children)
+        elif element.get('style') == 'text-align:left':
+            return "[align=left]{text}[/align]".format(text=children)
+        elif element.get('style') == 'text-align:right':
+            return "[align=right]{text}[/align]".format(text=children)
+    if element.tag == 'hr' and element.get('class') == 'bbcode_rule' :
+        return "[hr]"
+    if children:
+        return children.rstrip()
+
+def make_messages(count, seed=1):
+    rng = random.Random(seed)
+    messages = []
+    for i in range(count):
+        body = ' '.join(rng.choice(snippets)
+                        for _ in range(rng.randint(1, 8)))
+        messages.append(html.fragment_fromstring(
+                '<div class="post-content">{}</div>'.format(body),
+                create_parent='div'))
+    return messages
+
+def main():
+    desc = 'Benchmark HTML to BBCode conversion.'
+    parser = argparse.ArgumentParser(description=desc)
+    parser.add_argument('-n', type=int, default=2000, dest='count',
+                        help='number of messages')
+    parser.add_argument('-r', type=int, default=5, dest='repeat',
+                        help='number of timed runs, the best is reported')
+    args = parser.parse_args()
+
+    messages = make_messages(args.count)
+    results = []
+    for name, func in [
+            ('recursive', lambda t: legacy_parse_message(t, legacy_formatter)),
+            ('converter', mybb.convert)]:
+        best = min(timeit.repeat(lambda: [func(t) for t in messages],
+                                 number=1, repeat=args.repeat))
+        results.append(best)
+        print('{:<10} {:8.3f}s {:10.0f} messages/s'.format(
+                name, best, args.count / best))
+    print('speedup    {:8.2f}x'.format(results[0] / results[1]))
+
+if __name__ == '__main__':
+    main()
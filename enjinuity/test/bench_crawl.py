@@ -0,0 +1,97 @@
+# enjinuity
+# Written in 2016 by David H. Wei <https://github.com/spikeh/>
+#
+# To the extent possible under law, the author(s) have dedicated all
+# copyright and related and neighboring rights to this software to the
+# public domain worldwide. This software is distributed without any
+# warranty.
+#
+# You should have received a copy of the CC0 Public Domain Dedication
+# along with this software. If not, see
+# <http://creativecommons.org/publicdomain/zero/1.0/>.
+#
+# End to end crawl of a generated site served by the mock server, with
+# Scraper and Users, reporting time to complete and pages per second:
+#
+#     python -m enjinuity.test.bench_crawl [-t THREADS] [-p POSTS]
+#         [-m MEMBERS] [-w WORKERS] [-b BACKEND] [-l LATENCY]
+#         [-e ERROR_RATE] [-r RATE_LIMIT] [--login]
+import argparse
+import time
+from enjinuity.scraper import Scraper
+from enjinuity.test.generator import SiteGenerator
+from enjinuity.test.mockserver import MockEnjin
+from enjinuity.users import Users
+
+def crawl(name, server, expected, func):
+    before = dict(server.stats)
+    start = time.perf_counter()
+    try:
+        fetched = func()
+        error = ''
+    except Exception as e:
+        fetched = 0
+        error = '{}: {}'.format(type(e).__name__, e)
+    seconds = time.perf_counter() - start
+    stats = {k: v - before[k] for k, v in server.stats.items()}
+    print('{:<8} {:8.2f} {:6d}/{:<6d} {:10.1f} {:9d} {:7d} {:9d}  {}'.format(
+            name, seconds, fetched, expected, stats['pages'] / seconds,
+            stats['requests'], stats['errors'], stats['throttled'], error))
+
+def main():
+    desc = 'Benchmark crawling a mock Enjin site with Scraper and Users.'
+    parser = argparse.ArgumentParser(description=desc)
+    parser.add_argument('-t', type=int, default=10, dest='threads',
+                        help='threads per forum')
+    parser.add_argument('-p', type=int, default=20, dest='posts',
+                        help='average posts per thread')
+    parser.add_argument('-m', type=int, default=100, dest='members',
+                        help='members in the member list')
+    parser.add_argument('-w', type=int, default=4, dest='workers',
+                        help='Scraper and Users workers')
+    parser.add_argument('-b', choices=['browser', 'http'], default='http',
+                        dest='backend', help='fetcher backend')
+    parser.add_argument('-l', type=float, default=0.05, dest='latency',
+                        help='average seconds the server takes per page')
+    parser.add_argument('-e', type=float, default=0.0, dest='error_rate',
+                        help='share of requests that fail with 500')
+    parser.add_argument('-r', type=int, default=0, dest='rate_limit',
+                        help='requests a second before 429, 0 for no limit')
+    parser.add_argument('--login', action='store_true',
+                        help='only serve pages to logged in sessions, which'
+                        ' Users does not start')
+    parser.add_argument('--skip', choices=['scraper', 'users'],
+                        help='leave out one of the crawls')
+    args = parser.parse_args()
+
+    with MockEnjin(latency=args.latency, error_rate=args.error_rate,
+                   rate_limit=args.rate_limit,
+                   require_login=args.login) as server:
+        gen = SiteGenerator(server.url, threads=args.threads,
+                            posts=args.posts, members=args.members)
+        forum_pages = gen.forum_pages()
+        server.add_pages(forum_pages)
+        server.add_pages(gen.member_pages())
+        print('Serving {} forum pages and {} members at {}'.format(
+                len(forum_pages), args.members, server.url))
+        print('{:<8} {:>8} {:>13} {:>10} {:>9} {:>7} {:>9}'.format(
+                'crawl', 'seconds', 'done', 'pages/s', 'requests',
+                'errors', 'throttled'))
+
+        if args.skip != 'scraper':
+            def scrape():
+                scraper = Scraper(gen.forum_url, 'user', 'password',
+                                  workers=args.workers, backend=args.backend)
+                return len(scraper.get_site())
+            crawl('scraper', server, len(forum_pages), scrape)
+
+        if args.skip != 'users':
+            def scrape_users():
+                users = Users(gen.members_url, 'default@email.com',
+                              'password', ['Member'], args.backend,
+                              args.workers)
+                return len(users.get_map())
+            crawl('users', server, len(gen.get_user_map()), scrape_users)
+
+if __name__ == '__main__':
+    main()
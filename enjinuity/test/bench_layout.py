@@ -0,0 +1,74 @@
+# enjinuity
+# Written in 2016 by David H. Wei <https://github.com/spikeh/>
+#
+# To the extent possible under law, the author(s) have dedicated all
+# copyright and related and neighboring rights to this software to the
+# public domain worldwide. This software is distributed without any
+# warranty.
+#
+# You should have received a copy of the CC0 Public Domain Dedication
+# along with this software. If not, see
+# <http://creativecommons.org/publicdomain/zero/1.0/>.
+#
+# Per-post cost of reading a post row with XPath strings, compiled on
+# every call, against the compiled selectors of enjinuity.layout:
+#
+#     python -m enjinuity.test.bench_layout [-n POSTS] [-r REPEAT]
+import argparse
+import random
+import timeit
+from enjinuity.records import PostRecord, read_post
+from enjinuity.test.generator import snippets
+from lxml import html
+
+row = ('<tr class="row"><td><div class="cell"><div class="username">'
+       '<a href="/profile/{i}">user{i}</a></div></div></td>'
+       '<td><div class="post-wrapper"><div class="post-content">{message}'
+       '</div></div><div><div><div>Posted Jan {day}, 15 · Last edited '
+       'Sun at 03:52 pm</div></div></div></td></tr>')
+
+def make_rows(count, seed=1):
+    rng = random.Random(seed)
+    rows = ''.join(row.format(i=i, day=rng.randint(1, 28),
+                              message=rng.choice(snippets))
+                   for i in range(count))
+    page = html.fromstring('<html><body><table>{}</table></body></html>'
+                           .format(rows))
+    return page.xpath('//tr')
+
+# read_post() as it was before the selectors were compiled
+def read_post_strings(elem):
+    author = elem.xpath(
+      'td[1]/div[@class="cell"]/div[@class="username"]/a')[0].text_content()
+    times = [x.strip() for x in elem.xpath(
+             'td[2]/div[2]/div[1]/div[1]')[0].text_content().split('·')]
+    msg_elem = elem.xpath('td[2]/div[1]/div[1]')[0]
+    return PostRecord(author, times, msg_elem)
+
+def main():
+    desc = 'Benchmark reading post rows with compiled selectors.'
+    parser = argparse.ArgumentParser(description=desc)
+    parser.add_argument('-n', type=int, default=5000, dest='count',
+                        help='number of posts')
+    parser.add_argument('-r', type=int, default=5, dest='repeat',
+                        help='number of timed runs, the best is reported')
+    args = parser.parse_args()
+
+    rows = make_rows(args.count)
+    for elem in rows:
+        if read_post(elem) != read_post_strings(elem):
+            raise AssertionError('Records differ for post {}'.format(
+                    read_post(elem).author))
+
+    results = []
+    for name, func in [('strings', read_post_strings),
+                       ('compiled', read_post)]:
+        best = min(timeit.repeat(lambda: [func(e) for e in rows],
+                                 number=1, repeat=args.repeat))
+        results.append(best)
+        print('{:<10} {:8.2f}us per post'.format(
+                name, best / args.count * 1e6))
+    print('speedup    {:8.2f}x'.format(results[0] / results[1]))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+# enjinuity
+# Written in 2016 by David H. Wei <https://github.com/spikeh/>
+#
+# To the extent possible under law, the author(s) have dedicated all
+# copyright and related and neighboring rights to this software to the
+# public domain worldwide. This software is distributed without any
+# warranty.
+#
+# You should have received a copy of the CC0 Public Domain Dedication
+# along with this software. If not, see
+# <http://creativecommons.org/publicdomain/zero/1.0/>.
+#
+# Memory held by parsed threads, per post, with and without the
+# converted message bodies:
+#
+#     python -m enjinuity.test.bench_memory [-t THREADS] [-p POSTS]
+import argparse
+import random
+import sys
+import tracemalloc
+from datetime import datetime
+from enjinuity.dates import Clock
+from enjinuity.objects import FObject, Thread
+from enjinuity.records import PostRecord, ThreadPage, dump_record
+from enjinuity.test.generator import snippets
+
+authors = ['user{}'.format(i) for i in range(50)]
+
+# Thread pages stored as records, as Scraper(records=True) leaves them
+def make_site(threads, posts, seed=1):
+    rng = random.Random(seed)
+    site = {}
+    for t in range(threads):
+        records = [PostRecord(rng.choice(authors),
+                              ['Posted Jan {}, 15'.format(rng.randint(1, 28))],
+                              rng.choice(snippets))
+                   for _ in range(posts)]
+        page = ThreadPage(posts - 1, 'Thread {}'.format(t), 0, None, records,
+                          1)
+        url = 'http://example.enjin.com/forum/viewthread/{}'.format(t)
+        site[url] = dump_record(page)
+    return site
+
+def main():
+    desc = 'Benchmark the memory held by parsed posts.'
+    parser = argparse.ArgumentParser(description=desc)
+    parser.add_argument('-t', type=int, default=200, dest='threads',
+                        help='number of threads')
+    parser.add_argument('-p', type=int, default=50, dest='posts',
+                        help='posts per thread')
+    args = parser.parse_args()
+
+    site = make_site(args.threads, args.posts)
+    FObject.users = {name: uid for uid, name in enumerate(authors[::2], 2)}
+    FObject.clock = Clock(datetime(2016, 6, 1))
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    threads = [Thread(0, 0, url, site, None) for url in site]
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    nr_posts = sum(len(t.children) for t in threads)
+    messages = sum(sys.getsizeof(p.message) for t in threads
+                   for p in t.children)
+    print('posts      {:8d}'.format(nr_posts))
+    print('total      {:8.1f} bytes per post'.format(held / nr_posts))
+    print('messages   {:8.1f} bytes per post'.format(messages / nr_posts))
+    print('tree       {:8.1f} bytes per post'.format(
+            (held - messages) / nr_posts))
+
+if __name__ == '__main__':
+    main()
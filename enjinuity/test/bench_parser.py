@@ -0,0 +1,134 @@
+# enjinuity
+# Written in 2016 by David H. Wei <https://github.com/spikeh/>
+#
+# To the extent possible under law, the author(s) have dedicated all
+# copyright and related and neighboring rights to this software to the
+# public domain worldwide. This software is distributed without any
+# warranty.
+#
+# You should have received a copy of the CC0 Public Domain Dedication
+# along with this software. If not, see
+# <http://creativecommons.org/publicdomain/zero/1.0/>.
+#
+# Pages and posts per second, and peak memory, of Parser.dump_mybb() and
+# of the BBCode converter on a generated site:
+#
+#     python -m enjinuity.test.bench_parser [-f FORUMS] [-t THREADS]
+#         [-p POSTS] [-c COMPLEXITY] [-j PROCESSES] [--stream]
+#
+# Each stage runs in a process of its own, and its peak memory is the
+# peak resident set size of that process, libxml2 trees included. With
+# -j the largest parsing process is shown apart.
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from enjinuity.bbcode import mybb
+from enjinuity.dump import iter_dump
+from enjinuity.parser import Parser
+from enjinuity.records import read_page, read_thread_page
+from enjinuity.test.generator import SiteGenerator
+
+STAGES = ('parse', 'bbcode')
+
+# Peak resident bytes of this process, or of the largest finished child
+def max_rss(who=resource.RUSAGE_SELF):
+    rss = resource.getrusage(who).ru_maxrss
+    # Kilobytes everywhere but macOS
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+# Seconds, peak bytes and bytes added to the peak by func()
+def measure(func):
+    before = max_rss()
+    start = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - start
+    peak = max_rss()
+    return seconds, peak, peak - before
+
+# Run one stage on a freshly generated site and print what it measured
+def run_stage(args):
+    gen = SiteGenerator(forums=args.forums, threads=args.threads,
+                        posts=args.posts, complexity=args.complexity)
+    site = gen.forum_pages()
+    users = gen.get_user_map()
+    # Posts shown on every page of their thread are converted each time
+    thread_pages = [url for url in site if '/viewthread/' in url]
+
+    if args.stage == 'parse':
+        fd, filename = tempfile.mkstemp(suffix='.pkl')
+        os.close(fd)
+        try:
+            result = measure(lambda: Parser(
+                    gen.forum_url, site, users, args.processes,
+                    datetime(2016, 6, 1), args.stream).dump_mybb(filename))
+            nr_posts = sum(len(rows) for table, rows in iter_dump(filename)
+                           if table == 'posts')
+        finally:
+            os.remove(filename)
+        pages = len(site)
+    else:
+        # The message elements of every thread page, as the parser reads
+        # them
+        messages = []
+        for url in thread_pages:
+            first = '/page/' not in url
+            record = read_page(site[url], gen.base_url, read_thread_page,
+                               first)
+            messages.extend(post.message for post in record.posts)
+
+        def convert():
+            for message in messages:
+                mybb.convert_element(message)
+
+        result = measure(convert)
+        pages = len(thread_pages)
+        nr_posts = len(messages)
+    print(json.dumps([pages, nr_posts] + list(result) +
+                     [max_rss(resource.RUSAGE_CHILDREN)]))
+
+def main():
+    desc = 'Benchmark parsing a generated site and converting its posts.'
+    parser = argparse.ArgumentParser(description=desc)
+    parser.add_argument('-f', type=int, default=3, dest='forums',
+                        help='forums per category')
+    parser.add_argument('-t', type=int, default=20, dest='threads',
+                        help='threads per forum')
+    parser.add_argument('-p', type=int, default=20, dest='posts',
+                        help='average posts per thread')
+    parser.add_argument('-c', type=int, default=2, dest='complexity',
+                        help='most blocks of markup in a post')
+    parser.add_argument('-j', type=int, default=1, dest='processes',
+                        help='parser processes')
+    parser.add_argument('--stream', action='store_true',
+                        help='write the dump thread by thread')
+    parser.add_argument('--stage', choices=STAGES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stage:
+        run_stage(args)
+        return
+
+    results = []
+    for stage in STAGES:
+        out = subprocess.run([sys.executable, '-m', __spec__.name] +
+                             sys.argv[1:] + ['--stage', stage],
+                             stdout=subprocess.PIPE, check=True).stdout
+        results.append([stage] + json.loads(out.splitlines()[-1]))
+
+    print('{} pages, {} posts'.format(results[0][1], results[0][2]))
+    print('{:<8} {:>8} {:>10} {:>10} {:>9} {:>9} {:>9}'.format(
+            'stage', 'seconds', 'pages/s', 'posts/s', 'peak MB', 'added MB',
+            'worker MB'))
+    for name, pages, posts, seconds, peak, added, worker in results:
+        print('{:<8} {:8.3f} {:10.1f} {:10.1f} {:9.1f} {:9.1f} {:9.1f}'.format(
+                name, seconds, pages / seconds, posts / seconds, peak / 1e6,
+                added / 1e6, worker / 1e6))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+# enjinuity
+# Written in 2016 by David H. Wei <https://github.com/spikeh/>
+# and Italo Cotta <https://github.com/itcotta/>
+#
+# To the extent possible under law, the author(s) have dedicated all
+# copyright and related and neighboring rights to this software to the
+# public domain worldwide. This software is distributed without any
+# warranty.
+#
+# You should have received a copy of the CC0 Public Domain Dedication
+# along with this software. If not, see
+# <http://creativecommons.org/publicdomain/zero/1.0/>.
+#
+# Cost of converting post bodies by serializing and reparsing each
+# message element, against converting the element in place:
+#
+#     python -m enjinuity.test.bench_post [-n MESSAGES] [-r REPEAT]
+import argparse
+import timeit
+from enjinuity.bbcode import mybb
+from enjinuity.test.bench_bbcode import make_messages
+from lxml import etree, html
+
+def roundtrip(element):
+    tree = html.fragment_fromstring(etree.tostring(element, encoding=str),
+                                    create_parent='div')
+    return mybb.convert(tree)
+
+def main():
+    desc = 'Benchmark converting post bodies in place.'
+    parser = argparse.ArgumentParser(description=desc)
+    parser.add_argument('-n', type=int, default=2000, dest='count',
+                        help='number of messages')
+    parser.add_argument('-r', type=int, default=5, dest='repeat',
+                        help='number of timed runs, the best is reported')
+    args = parser.parse_args()
+
+    # The message elements, as read_post() finds them in a thread page
+    elements = [tree[0] for tree in make_messages(args.count)]
+    for element in elements:
+        if mybb.convert_element(element) != roundtrip(element):
+            raise AssertionError('Output differs for:\n{}'.format(
+                    etree.tostring(element, encoding=str)))
+
+    results = []
+    for name, func in [('roundtrip', roundtrip),
+                       ('in place', mybb.convert_element)]:
+        best = min(timeit.repeat(lambda: [func(e) for e in elements],
+                                 number=1, repeat=args.repeat))
+        results.append(best)
+        print('{:<10} {:8.3f}s {:10.0f} messages/s'.format(
+                name, best, args.count / best))
+    print('speedup    {:8.2f}x'.format(results[0] / results[1]))
+
+if __name__ == '__main__':
+    main()
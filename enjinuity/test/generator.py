@@ -0,0 +1,335 @@
+# enjinuity
+# Written in 2016 by David H. Wei <https://github.com/spikeh/>
+#
+# To the extent possible under law, the author(s) have dedicated all
+# copyright and related and neighboring rights to this software to the
+# public domain worldwide. This software is distributed without any
+# warranty.
+#
+# You should have received a copy of the CC0 Public Domain Dedication
+# along with this software. If not, see
+# <http://creativecommons.org/publicdomain/zero/1.0/>.
+#
+# Made-up Enjin sites, laid out the way enjinuity.layout reads them, for
+# the benchmarks and the mock server.
+import random
+from urllib.parse import urljoin, urlsplit
+
+BASE_URL = 'http://example.enjin.com/'
+
+# Post body markup; the first two are inline, the rest are blocks
+snippets = [
+    'Hello <b>world</b>, some <i>italic</i> and <u>underlined</u> text<br>',
+    '<s>struck</s> <del>deleted</del> <strike>old</strike> <em>em</em> '
+    '<strong>strong</strong>',
+    '<div class="bbcode_quote"><div class="bbcode_quote_decorator"></div>'
+    '<div class="bbcode_quote_head"><div class="element_avatar"></div>'
+    '<div class="user"><a href="/profile/1">Bob</a></div></div>'
+    '<div class="bbcode_quote_body">Bob wrote: quoted <b>text</b></div>'
+    '</div>',
+    '<div class="bbcode_quote"><div class="bbcode_quote_decorator"></div>'
+    '<div class="bbcode_quote_head">Quote:</div>'
+    '<div class="bbcode_quote_body">anonymous quote</div></div>',
+    '<div class="bbcode spoiler"><div class="spoiler-title">Spoiler</div>'
+    '<div class="spoiler-body">hidden <img class="bbcode_smiley" '
+    'title=":)" src="/smiley.png"></div></div>',
+    '<ul><li>one</li><li>two <a href="http://example.com/">link</a></li>'
+    '</ul><ol><li>first</li><li>second</li></ol>',
+    '<div class="bbcode_code"><div class="bbcode_code_head">Code:</div>'
+    '<div class="bbcode_code_body">x = 1\n  y = 2</div></div>',
+    '<span style="font-size:18px">big</span> <span style="color:#ff0000">'
+    'red</span> <span>plain</span> <div class="c" '
+    'style="text-align:center">centered</div><hr class="bbcode_rule">',
+    '<img src="http://example.com/a.png"> <a href="/empty"></a> '
+    '<!-- comment --> tail <p>paragraph</p>',
+    '<object><param name="movie" '
+    'value="http://www.youtube.com/v/abc123&amp;hl=en"></object>'
+]
+inline = snippets[:2]
+blocks = snippets[2:]
+
+# Links are relative to the site, as on Enjin, so the pages can be
+# served from anywhere
+def path(url):
+    return urlsplit(url).path
+
+months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep',
+          'Oct', 'Nov', 'Dec']
+weekdays = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+page_html = ('<html><head><title>{title}</title></head><body>'
+             '<div id="section-main">{body}</div></body></html>')
+
+category_html = ('<div class="contentbox category"><div><div></div><div>'
+                 '</div><div><span> {name} </span></div></div><div><table>'
+                 '{rows}</table></div></div>')
+
+index_row_html = ('<tr><td class="c forum"><div><a href="{url}"> {name} '
+                  '</a></div><div> {desc} </div></td></tr>')
+
+subforums_html = ('<div class="contentbox subforums-block"><div></div><div>'
+                  '<table>{rows}</table></div></div>')
+
+subforum_row_html = ('<tr class="row"><td></td><td><div><a href="{url}"> '
+                     '{name} </a></div><div> {desc} </div></td></tr>')
+
+threads_html = ('<div class="contentbox threads"><div><div class="text-right">'
+                '{posts} posts · {threads} threads</div></div><div><table>'
+                '{rows}</table></div></div>')
+
+thread_row_html = ('<tr class="row"><td><a><div class="icon{sticky}"></div>'
+                   '</a></td><td><a class="thread-view thread-subject" '
+                   'href="{url}">{subject}</a></td><td class="replies">'
+                   '{replies}</td><td class="views"> {views} </td>'
+                   '<td class="lastpost"><a href="{url}#last">{author}</a>'
+                   '</td></tr>')
+
+moved_row_html = ('<tr class="row moved"><td><a><div class="icon"></div></a>'
+                  '</td><td><a class="thread-view thread-subject" '
+                  'href="{url}">{subject}</a></td><td class="views"> 0 </td>'
+                  '</tr>')
+
+# Forum listings and member lists give their number of pages in an input
+input_pager_html = ('<div class="widgets top"><div class="right"><div><div>'
+                    '<input maxlength="{pages}"/></div></div></div></div>')
+
+span_pager_html = ('<div class="widgets top"><div class="right"><div><span>'
+                   'Page {page}</span><span>of {pages}</span></div></div>'
+                   '</div>')
+
+posts_html = ('<div class="contentbox posts"><div><div></div><div '
+              'class="text-right">{replies} replies</div><div><span><div>'
+              '<div class="{flags}"></div></div><h1> {subject} </h1></span>'
+              '</div></div><div><table>{rows}</table></div></div>')
+
+post_row_html = ('<tr class="row"><td><div class="cell"><div '
+                 'class="username"><a href="{url}">{author}</a></div></div>'
+                 '</td><td><div class="post-wrapper"><div '
+                 'class="post-content">{message}</div>{poll}</div><div><div>'
+                 '<div>{times}</div></div></div></td></tr>')
+
+poll_html = ('<div class="post-poll-area"><div>{question}</div><div><form>'
+             '<div><div><input type="{type}"/></div></div>{answers}</form>'
+             '</div><div class="number-votes">Total <b>voters</b> {voters}'
+             '</div></div>')
+
+answer_html = ('<div class="answer"><div class="answer-title">{title}</div>'
+               '<div class="clabel"><span class="text-alter">{votes} votes'
+               '</span></div></div>')
+
+members_html = '<table class="members">{rows}</table>'
+
+member_row_html = ('<tr class="row"><td class="col-tags">{tags}</td>'
+                   '<td class="col-displayname"><a href="{url}">{name}</a>'
+                   '</td><td class="col-datejoined">{joined}</td>'
+                   '<td class="col-lastseen">{lastseen}</td></tr>')
+
+profile_html = ('<div class="widget_ministats"><div>Posts</div><div>Views'
+                '</div><div><h4>{rep}</h4></div></div>')
+
+
+class SiteGenerator:
+    """A made-up Enjin site, with its forum and member list pages.
+
+    There are `categories` categories of `forums` forums, each with
+    `subforums` subforums. Every forum and subforum has `threads`
+    threads of about `posts` posts on average, shown `threads_per_page`
+    and `posts_per_page` at a time. A share `polls` of the threads have
+    a poll. Each post has up to `complexity` blocks of markup, such as
+    quotes, spoilers, lists and code, after its text. The member list
+    has `members` members, `members_per_page` to a page; every fifth is
+    tagged Guest rather than Member, and a few posts are by people who
+    are not members at all. The same `seed` gives the same pages.
+    """
+
+    def __init__(self, base_url=BASE_URL, categories=2, forums=3,
+                 subforums=1, threads=10, posts=10, threads_per_page=20,
+                 posts_per_page=10, polls=0.2, complexity=2, members=50,
+                 members_per_page=20, seed=1):
+        self.base_url = base_url
+        self.forum_url = urljoin(base_url, '/forum')
+        self.members_url = urljoin(base_url, '/users')
+        self.categories = categories
+        self.forums = forums
+        self.subforums = subforums
+        self.threads = threads
+        self.posts = posts
+        self.threads_per_page = threads_per_page
+        self.posts_per_page = posts_per_page
+        self.polls = polls
+        self.complexity = complexity
+        self.members = ['member{}'.format(i) for i in range(members)]
+        self.members_per_page = members_per_page
+        self.seed = seed
+
+    def get_tags(self, i):
+        return 'Guest' if i % 5 == 4 else 'Member'
+
+    # {name: uid} as Users.get_map() gives it for validtags=['Member']
+    def get_user_map(self):
+        names = [name for i, name in enumerate(self.members)
+                 if self.get_tags(i) == 'Member']
+        return {name: uid for uid, name in enumerate(names, 2)}
+
+    def message(self, rng):
+        parts = [rng.choice(inline)]
+        parts.extend(rng.choice(blocks)
+                     for _ in range(rng.randint(0, self.complexity)))
+        return ' '.join(parts)
+
+    def date(self, rng):
+        r = rng.random()
+        if r < 0.05:
+            return '{} hours ago'.format(rng.randint(1, 23))
+        if r < 0.1:
+            return '{} at {:02d}:{:02d} {}'.format(
+                    rng.choice(weekdays), rng.randint(1, 12),
+                    rng.randint(0, 59), rng.choice(['am', 'pm']))
+        return '{} {}, {}'.format(rng.choice(months), rng.randint(1, 28),
+                                  rng.randint(13, 16))
+
+    def author(self, rng):
+        if rng.random() < 0.05:
+            return 'Visitor{}'.format(rng.randint(1, 9))
+        return rng.choice(self.members)
+
+    def post_row(self, rng, author, first, poll=''):
+        times = ['Posted ' + self.date(rng)]
+        if first:
+            times.append('OP')
+        if rng.random() < 0.2:
+            times.append('Last edited ' + self.date(rng))
+        return post_row_html.format(
+                url='/profile/{}'.format(author), author=author,
+                message=self.message(rng), poll=poll,
+                times=' · '.join(times))
+
+    def poll(self, rng):
+        votes = [rng.randint(0, 20) for _ in range(rng.randint(2, 5))]
+        answers = ''.join([answer_html.format(title='Option {}'.format(i),
+                                              votes=v)
+                           for i, v in enumerate(votes, 1)])
+        return poll_html.format(question='Which one?',
+                                type=rng.choice(['radio', 'checkbox']),
+                                answers=answers, voters=sum(votes))
+
+    # The pages of one thread; returns the number of posts
+    def add_thread(self, rng, site, url, subject):
+        nr_posts = rng.randint(1, 2 * self.posts - 1)
+        poll = self.poll(rng) if rng.random() < self.polls else ''
+        flags = 'thread-flags locked' if rng.random() < 0.1 else 'thread-flags'
+        rows = [self.post_row(rng, self.author(rng), i == 0,
+                              poll if i == 0 else '')
+                for i in range(nr_posts)]
+        pages = -(-nr_posts // self.posts_per_page)
+        for page in range(1, pages + 1):
+            page_rows = rows[(page - 1) * self.posts_per_page:
+                             page * self.posts_per_page]
+            # The first post of a thread with a poll is on every page
+            if poll and page > 1:
+                page_rows.insert(0, rows[0])
+            pager = (span_pager_html.format(page=page, pages=pages)
+                     if pages > 1 else '')
+            body = pager + posts_html.format(
+                    replies=nr_posts - 1, flags=flags, subject=subject,
+                    rows=''.join(page_rows))
+            page_url = url if page == 1 else '{}/page/{}'.format(url, page)
+            site[page_url] = page_html.format(title=subject, body=body)
+        return nr_posts
+
+    def add_forum(self, rng, site, url, name, depth):
+        subforums = []
+        if depth == 0:
+            for i in range(self.subforums):
+                sf_url = '{}-{}'.format(url, i)
+                sf_name = '{} {}'.format(name, i)
+                self.add_forum(rng, site, sf_url, sf_name, depth + 1)
+                subforums.append(subforum_row_html.format(
+                        url=path(sf_url), name=sf_name,
+                        desc='About ' + sf_name))
+
+        rows = []
+        total = 0
+        for i in range(self.threads):
+            self.thread_id += 1
+            t_url = urljoin(self.base_url,
+                            '/forum/viewthread/{}'.format(self.thread_id))
+            subject = 'Thread {}'.format(self.thread_id)
+            nr_posts = self.add_thread(rng, site, t_url, subject)
+            total += nr_posts
+            rows.append(thread_row_html.format(
+                    sticky=' sticky' if rng.random() < 0.05 else '',
+                    url=path(t_url), subject=subject, replies=nr_posts - 1,
+                    views=rng.randint(nr_posts, 50 * nr_posts),
+                    author=self.author(rng)))
+
+        pages = max(1, -(-len(rows) // self.threads_per_page))
+        for page in range(1, pages + 1):
+            page_rows = rows[(page - 1) * self.threads_per_page:
+                             page * self.threads_per_page]
+            body = ''
+            if page == 1:
+                # Threads moved elsewhere are listed but not counted
+                page_rows.append(moved_row_html.format(
+                        url='/forum/viewthread/0',
+                        subject='Moved'))
+                if subforums:
+                    body += subforums_html.format(rows=''.join(subforums))
+            if pages > 1:
+                body += input_pager_html.format(pages=pages)
+            body += threads_html.format(posts=total, threads=len(rows),
+                                        rows=''.join(page_rows))
+            page_url = url if page == 1 else '{}/page/{}'.format(url, page)
+            site[page_url] = page_html.format(title=name, body=body)
+
+    # URL -> page, as Scraper.get_site() returns them
+    def forum_pages(self):
+        rng = random.Random(self.seed)
+        site = {}
+        self.thread_id = 0
+        categories = []
+        for c in range(self.categories):
+            rows = []
+            for f in range(self.forums):
+                url = urljoin(self.base_url,
+                              '/forum/viewforum/{}-{}'.format(c, f))
+                name = 'Forum {}-{}'.format(c, f)
+                self.add_forum(rng, site, url, name, 0)
+                rows.append(index_row_html.format(url=path(url), name=name,
+                                                  desc='About ' + name))
+            categories.append(category_html.format(
+                    name='Category {}'.format(c), rows=''.join(rows)))
+        site[self.forum_url] = page_html.format(title='Forum',
+                                                body=''.join(categories))
+        return {url: page.encode('ascii', 'xmlcharrefreplace')
+                for url, page in site.items()}
+
+    # URL -> page of the member list and the profiles
+    def member_pages(self):
+        rng = random.Random(self.seed)
+        site = {}
+        rows = []
+        for i, name in enumerate(self.members):
+            url = urljoin(self.base_url, '/profile/{}'.format(name))
+            tags = '<span>{}</span>'.format(self.get_tags(i))
+            joined = '{} {}, {}'.format(rng.choice(months), rng.randint(1, 28),
+                                        rng.randint(10, 12))
+            lastseen = 'Online Now' if rng.random() < 0.05 else self.date(rng)
+            rows.append(member_row_html.format(
+                    tags=tags, url=path(url), name=name, joined=joined,
+                    lastseen=lastseen))
+            site[url] = page_html.format(
+                    title=name, body=profile_html.format(
+                            rep=rng.randint(0, 100)))
+
+        pages = max(1, -(-len(rows) // self.members_per_page))
+        for page in range(1, pages + 1):
+            body = input_pager_html.format(pages=pages) if pages > 1 else ''
+            body += members_html.format(rows=''.join(
+                    rows[(page - 1) * self.members_per_page:
+                         page * self.members_per_page]))
+            url = (self.members_url if page == 1 else
+                   '{}/page/{}'.format(self.members_url, page))
+            site[url] = page_html.format(title='Members', body=body)
+        return {url: page.encode('ascii', 'xmlcharrefreplace')
+                for url, page in site.items()}
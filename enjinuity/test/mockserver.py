@@ -0,0 +1,177 @@
+# enjinuity
+# Written in 2016 by David H. Wei <https://github.com/spikeh/>
+#
+# To the extent possible under law, the author(s) have dedicated all
+# copyright and related and neighboring rights to this software to the
+# public domain worldwide. This software is distributed without any
+# warranty.
+#
+# You should have received a copy of the CC0 Public Domain Dedication
+# along with this software. If not, see
+# <http://creativecommons.org/publicdomain/zero/1.0/>.
+#
+# A local stand-in for an Enjin site, serving generated pages over HTTP
+# with some latency, errors and rate limiting, for crawl benchmarks.
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+# The login form, nested the way enjinuity.layout.login finds its fields
+login_html = (
+    '<html><head><title>Login</title></head><body><div id="section-main">'
+    '<div><div></div><div></div><div><div></div><div>'
+    '<div></div><div></div><div></div><div></div><div></div><div></div>'
+    '<div></div><div><table><tbody><tr><td><div><div><div><div><table>'
+    '<tbody><tr><td></td><td><form method="post" action="/login">'
+    '<div>Login</div>'
+    '<div><input type="text" name="username"/></div>'
+    '<div>Password</div>'
+    '<div><input type="password" name="password"/></div>'
+    '<div><div><input type="submit" value="Login"/></div></div>'
+    '</form></td></tr></tbody></table></div></div></div></div></td></tr>'
+    '</tbody></table></div></div></div></div></div></body></html>'
+).encode()
+
+COOKIE = 'enjin_session'
+
+
+class MockHandler(BaseHTTPRequestHandler):
+
+    # Keep-alive, as HttpFetcher pools its connections
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.serve_page(self)
+
+    def do_POST(self):
+        self.server.serve_login(self)
+
+    def send_page(self, status, body, headers=()):
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockEnjin(ThreadingHTTPServer):
+    """Serves pages by path, like an Enjin site would.
+
+    Every request waits about `latency` seconds. A share `error_rate` of
+    the requests fail with 500, and requests beyond `rate_limit` a second
+    get 429. The login form is at /login; with `require_login`, pages are
+    only served to sessions that posted it. Counts of what was served are
+    kept in `stats`.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), latency=0.0, error_rate=0.0,
+                 rate_limit=0, require_login=False, seed=1):
+        super().__init__(address, MockHandler)
+        self.pages = {'/login': login_html}
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.require_login = require_login
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        # Requests allowed before the rate limit, refilled every second
+        self.tokens = rate_limit
+        self.refilled = time.monotonic()
+        self.stats = {'requests': 0, 'pages': 0, 'errors': 0, 'throttled': 0,
+                      'missing': 0, 'logins': 0}
+        self.thread = None
+
+    @property
+    def url(self):
+        return 'http://{}:{}/'.format(*self.server_address[:2])
+
+    # URL -> page, from SiteGenerator; only the path of each URL is kept
+    def add_pages(self, pages):
+        for url, page in pages.items():
+            self.pages[urlsplit(url).path] = page
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.thread:
+            self.shutdown()
+            self.thread.join()
+            self.thread = None
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    # Whether a request may go ahead, and if so whether it should fail
+    def admit(self):
+        with self.lock:
+            self.stats['requests'] += 1
+            if self.rate_limit:
+                now = time.monotonic()
+                self.tokens = min(self.rate_limit, self.tokens +
+                                  (now - self.refilled) * self.rate_limit)
+                self.refilled = now
+                if self.tokens < 1:
+                    self.stats['throttled'] += 1
+                    return 429
+                self.tokens -= 1
+            if self.rng.random() < self.error_rate:
+                self.stats['errors'] += 1
+                return 500
+            delay = self.latency * self.rng.uniform(0.5, 1.5)
+        time.sleep(delay)
+        return 200
+
+    def logged_in(self, handler):
+        return '{}='.format(COOKIE) in handler.headers.get('Cookie', '')
+
+    def serve_page(self, handler):
+        status = self.admit()
+        if status == 429:
+            handler.send_page(429, b'Too many requests',
+                              [('Retry-After', '1')])
+            return
+        if status == 500:
+            handler.send_page(500, b'Internal server error')
+            return
+        path = urlsplit(handler.path).path.rstrip('/') or '/'
+        if path == '/':
+            path = '/forum'
+        if path not in self.pages:
+            self.count('missing')
+            handler.send_page(404, b'Not found')
+        elif (self.require_login and path != '/login' and
+                not self.logged_in(handler)):
+            handler.send_page(302, b'', [('Location', '/login')])
+        else:
+            self.count('pages')
+            handler.send_page(200, self.pages[path])
+
+    def serve_login(self, handler):
+        length = int(handler.headers.get('Content-Length', 0))
+        handler.rfile.read(length)
+        self.count('logins')
+        handler.send_page(302, b'', [
+                ('Location', '/forum'),
+                ('Set-Cookie', '{}={}; Path=/'.format(
+                        COOKIE, self.rng.getrandbits(64)))])
@@ -0,0 +1,101 @@
+# enjinuity
+# Written in 2016 by David H. Wei <https://github.com/spikeh/>
+#
+# To the extent possible under law, the author(s) have dedicated all
+# copyright and related and neighboring rights to this software to the
+# public domain worldwide. This software is distributed without any
+# warranty.
+#
+# You should have received a copy of the CC0 Public Domain Dedication
+# along with this software. If not, see
+# <http://creativecommons.org/publicdomain/zero/1.0/>.
+import pickle
+from datetime import datetime, timezone
+from enjinuity.archive import Archive, load_site
+
+BASE = 'http://example.enjin.com'
+
+pages = {'{}/forum/viewthread/{}'.format(BASE, i): 'page {}'.format(i).encode()
+         for i in range(20)}
+
+# Write pages without closing, as if the crawl had crashed
+def write_unclosed(filename):
+    archive = Archive(filename, 'w')
+    for url, page in pages.items():
+        archive[url] = page
+    archive.flush()
+    archive.file.close()
+
+def test_round_trip(tmp_path):
+    filename = str(tmp_path / 'site.arc')
+    with Archive(filename, 'w') as archive:
+        for url, page in pages.items():
+            archive[url] = page
+        # Pages can be read back while they are being written
+        assert archive[BASE + '/forum/viewthread/3'] == b'page 3'
+    site = load_site(filename)
+    assert dict(site.items()) == pages
+    assert len(site) == len(pages)
+    # Other processes open the file again
+    assert dict(pickle.loads(pickle.dumps(site)).items()) == pages
+    site.close()
+
+def test_rebuild_index(tmp_path):
+    filename = str(tmp_path / 'site.arc')
+    write_unclosed(filename)
+    site = Archive(filename)
+    assert dict(site.items()) == pages
+    site.close()
+
+def test_rebuild_drops_torn_record(tmp_path):
+    filename = str(tmp_path / 'site.arc')
+    write_unclosed(filename)
+    with open(filename, 'ab') as f:
+        f.write(b'\x10\x00\x00\x00\xff\x00\x00\x00' + b'http://example')
+    site = Archive(filename)
+    assert dict(site.items()) == pages
+    site.close()
+
+def test_append_after_crash(tmp_path):
+    filename = str(tmp_path / 'site.arc')
+    write_unclosed(filename)
+    with Archive(filename, 'a') as archive:
+        archive[BASE + '/forum'] = b'index'
+    site = Archive(filename)
+    assert len(site) == len(pages) + 1
+    assert site[BASE + '/forum'] == b'index'
+    assert site[BASE + '/forum/viewthread/19'] == b'page 19'
+    site.close()
+
+def test_link(tmp_path):
+    filename = str(tmp_path / 'site.arc')
+    url = BASE + '/forum/viewthread/1'
+    with Archive(filename, 'w') as archive:
+        archive[url] = b'thread'
+        archive.link(url + '/', url)
+    site = Archive(filename)
+    assert site[url + '/'] == site[url] == b'thread'
+    assert sorted(site) == [url, url + '/']
+    site.close()
+
+def test_scraped(tmp_path):
+    filename = str(tmp_path / 'site.arc')
+    when = datetime(2016, 6, 1, tzinfo=timezone.utc)
+    archive = Archive(filename, 'w')
+    archive.set_scraped(when)
+    archive[BASE + '/forum'] = b'index'
+    archive.flush()
+    archive.file.close()
+    # Kept through an index rebuild, and out of the pages
+    site = Archive(filename)
+    assert site.scraped == when
+    assert list(site) == [BASE + '/forum']
+    site.close()
+    with Archive(filename, 'a'):
+        pass
+    site = Archive(filename)
+    assert site.scraped == when
+    assert len(site) == 1
+    site.close()
+    write_unclosed(filename)
+    assert Archive(filename).scraped is None
@@ -0,0 +1,24 @@
+# enjinuity
+# Written in 2016 by David H. Wei <https://github.com/spikeh/>
+#
+# To the extent possible under law, the author(s) have dedicated all
+# copyright and related and neighboring rights to this software to the
+# public domain worldwide. This software is distributed without any
+# warranty.
+#
+# You should have received a copy of the CC0 Public Domain Dedication
+# along with this software. If not, see
+# <http://creativecommons.org/publicdomain/zero/1.0/>.
+from enjinuity.bbcode import mybb
+from enjinuity.test.bench_bbcode import (legacy_formatter,
+                                         legacy_parse_message, make_messages)
+from lxml import etree
+
+# The converter writes exactly what the recursive formatter did, for the
+# post bodies and for the message elements the parser passes it
+def test_same_as_legacy():
+    for tree in make_messages(500):
+        expected = legacy_parse_message(tree, legacy_formatter)
+        source = etree.tostring(tree, encoding=str)
+        assert mybb.convert(tree) == expected, source
+        assert mybb.convert_element(tree[0]) == expected, source
@@ -0,0 +1,57 @@
+# enjinuity
+# Written in 2016 by David H. Wei <https://github.com/spikeh/>
+#
+# To the extent possible under law, the author(s) have dedicated all
+# copyright and related and neighboring rights to this software to the
+# public domain worldwide. This software is distributed without any
+# warranty.
+#
+# You should have received a copy of the CC0 Public Domain Dedication
+# along with this software. If not, see
+# <http://creativecommons.org/publicdomain/zero/1.0/>.
+from enjinuity.frontier import (FORUM, FORUM_PAGE, INDEX, THREAD,
+                                THREAD_PAGE, Frontier, normalize_url)
+
+BASE = 'http://example.enjin.com'
+
+def test_normalize_url():
+    url = BASE + '/forum/viewforum/1'
+    spelt = 'HTTP://Example.Enjin.com:80/forum/viewforum/1'
+    assert normalize_url(spelt) == url
+    assert normalize_url(BASE + '//forum///viewforum/1/') == url
+    assert normalize_url(url + '#post-2') == url
+    assert normalize_url(BASE) == BASE + '/'
+    # Queries and other ports are part of the page
+    assert normalize_url(url + '?page=2') == url + '?page=2'
+    assert normalize_url('http://example.enjin.com:8080/') != BASE + '/'
+
+def test_push_once():
+    frontier = Frontier()
+    url = BASE + '/forum/viewforum/1'
+    assert frontier.push(FORUM, url)
+    assert not frontier.push(FORUM, url + '/')
+    assert not frontier.push(FORUM_PAGE, BASE.upper() + '/forum/viewforum/1')
+    assert len(frontier) == 1
+    assert url + '/' in frontier
+    assert frontier.canonical(url + '/') == url
+    assert frontier.canonical(BASE + '/forum/viewforum/2') is None
+
+def test_mark():
+    frontier = Frontier()
+    url = BASE + '/forum/viewthread/1'
+    frontier.mark(url)
+    assert len(frontier) == 0
+    assert not frontier.push(THREAD, url + '/')
+    assert frontier.canonical(url + '/') == url
+
+def test_priority_order():
+    frontier = Frontier()
+    pushed = [(THREAD, BASE + '/t/1'), (FORUM, BASE + '/f/1'),
+              (THREAD_PAGE, BASE + '/t/1/page/2'), (INDEX, BASE + '/forum'),
+              (FORUM_PAGE, BASE + '/f/1/page/2')]
+    for kind, url in pushed:
+        frontier.push(kind, url)
+    expected = [pushed[1], pushed[3], pushed[4], pushed[0], pushed[2]]
+    assert frontier.pending() == expected
+    assert [frontier.pop() for _ in pushed] == expected
+    assert len(frontier) == 0
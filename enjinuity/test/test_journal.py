@@ -0,0 +1,81 @@
+# enjinuity
+# Written in 2016 by David H. Wei <https://github.com/spikeh/>
+#
+# To the extent possible under law, the author(s) have dedicated all
+# copyright and related and neighboring rights to this software to the
+# public domain worldwide. This software is distributed without any
+# warranty.
+#
+# You should have received a copy of the CC0 Public Domain Dedication
+# along with this software. If not, see
+# <http://creativecommons.org/publicdomain/zero/1.0/>.
+import os
+from enjinuity.frontier import FORUM, INDEX, THREAD
+from enjinuity.journal import Journal
+from enjinuity.scraper import Scraper
+
+BASE = 'http://example.enjin.com'
+
+def write_journal(filename):
+    journal = Journal(filename, interval=2)
+    journal.log_cookies([{'name': 'session', 'value': '1'}])
+    journal.log_page(INDEX, BASE + '/forum', b'index')
+    journal.log_page(FORUM, BASE + '/forum/viewforum/1', b'forum')
+    journal.checkpoint([(THREAD, BASE + '/forum/viewthread/1')], {})
+    journal.log_page(THREAD, BASE + '/forum/viewthread/1', b'thread')
+    journal.close()
+
+def test_replay(tmp_path):
+    filename = str(tmp_path / 'crawl.journal')
+    write_journal(filename)
+    journal = Journal(filename)
+    assert journal.cookies == [{'name': 'session', 'value': '1'}]
+    assert journal.site[BASE + '/forum/viewforum/1'] == b'forum'
+    assert journal.pending == [(THREAD, BASE + '/forum/viewthread/1')]
+    assert journal.get_unexpanded() == [
+            (THREAD, BASE + '/forum/viewthread/1')]
+    assert not journal.done
+    journal.close()
+
+def test_truncated_record(tmp_path):
+    filename = str(tmp_path / 'crawl.journal')
+    write_journal(filename)
+    size = os.path.getsize(filename)
+    # A record cut off by a crash
+    with open(filename, 'ab') as f:
+        f.write(b'\x80\x04\x95\x10\x00\x00')
+    journal = Journal(filename)
+    assert os.path.getsize(filename) == size
+    assert len(journal.pages) == 3
+    # Records written after the torn one was dropped are read back
+    journal.log_page(THREAD, BASE + '/forum/viewthread/2', b'thread 2')
+    journal.close()
+    journal = Journal(filename)
+    assert journal.site[BASE + '/forum/viewthread/2'] == b'thread 2'
+    assert len(journal.pages) == 4
+    journal.close()
+
+def test_finish_keeps_aliases(tmp_path):
+    filename = str(tmp_path / 'crawl.journal')
+    write_journal(filename)
+    url = BASE + '/forum/viewforum/1'
+    journal = Journal(filename)
+    journal.finish({url + '/': url})
+    journal.close()
+    journal = Journal(filename)
+    assert journal.done
+    assert journal.aliases == {url + '/': url}
+    journal.close()
+
+def test_completed_crawl_has_aliases(tmp_path):
+    filename = str(tmp_path / 'crawl.journal')
+    write_journal(filename)
+    url = BASE + '/forum/viewforum/1'
+    journal = Journal(filename)
+    journal.finish({url + '/': url})
+    journal.close()
+    # A completed journal is loaded without logging in
+    site = Scraper(BASE + '/forum', 'user', 'password',
+                   journal=filename).get_site()
+    assert site[url + '/'] == site[url] == b'forum'
+    assert len(site) == 4
@@ -0,0 +1,157 @@
+# enjinuity
+# Written in 2016 by David H. Wei <https://github.com/spikeh/>
+#
+# To the extent possible under law, the author(s) have dedicated all
+# copyright and related and neighboring rights to this software to the
+# public domain worldwide. This software is distributed without any
+# warranty.
+#
+# You should have received a copy of the CC0 Public Domain Dedication
+# along with this software. If not, see
+# <http://creativecommons.org/publicdomain/zero/1.0/>.
+import pytest
+from datetime import datetime
+from enjinuity.dates import Clock
+from enjinuity.dump import load_dump
+from enjinuity.objects import Forum, Poll, Post, Thread
+from enjinuity.parser import Parser
+from enjinuity.test.generator import SiteGenerator
+from lxml import html
+from urllib.parse import urljoin
+
+NOW = datetime(2016, 6, 1)
+
+
+@pytest.fixture
+def gen():
+    return SiteGenerator(categories=2, forums=2, subforums=1, threads=6,
+                         posts=8, threads_per_page=4, posts_per_page=5,
+                         polls=0.3, members=20)
+
+# The tables and user counts of a parse, with IDs numbered from 1 as in
+# a fresh process
+def parse(gen, filename, **kwargs):
+    Forum.fid = Thread.tid = Post.pid = Poll.pid = Poll.vid = 1
+    parser = Parser(gen.forum_url, gen.forum_pages(), gen.get_user_map(),
+                    now=NOW, **kwargs)
+    parser.dump_mybb(filename)
+    # Streamed dumps write the threads before the forums
+    db = {table: sorted(rows, key=lambda row: row[0])
+          for table, rows in load_dump(filename).items()}
+    return db, parser.get_user_counts()
+
+def test_same_for_any_processes(gen, tmp_path):
+    filename = str(tmp_path / 'forum.pkl')
+    db, counts = parse(gen, filename)
+    assert all(db[table] for table in ('forums', 'threads', 'posts',
+                                       'polls', 'pollvotes'))
+    assert parse(gen, filename, processes=4) == (db, counts)
+    assert parse(gen, filename, stream=True) == (db, counts)
+    assert parse(gen, filename, processes=4, stream=True) == (db, counts)
+
+# The pages of a listing or thread at url, as lxml trees
+def read_pages(site, url):
+    first = html.fromstring(site[url])
+    pages = [first]
+    pager = first.xpath('//input/@maxlength')
+    if not pager:
+        pager = [s.text.split(' ')[1] for s in first.xpath('//span')
+                 if s.text and s.text.startswith('of ')]
+    for i in range(2, int(pager[0]) + 1 if pager else 1):
+        pages.append(html.fromstring(site['{}/page/{}'.format(url, i)]))
+    return pages
+
+# (subject, [(author, posttime)]) of a thread, with times after the
+# first made later than the post before them, as the parser does
+def read_thread(site, url, clock):
+    pages = read_pages(site, url)
+    subject = pages[0].xpath('//h1')[0].text.strip()
+    poll = len(pages[0].xpath('//div[@class="post-poll-area"]')) > 0
+    posts = []
+    for i, page in enumerate(pages):
+        rows = page.xpath('//tr[@class="row"]')
+        # The first post of a poll thread is shown on every page
+        for row in rows[1:] if poll and i else rows:
+            author = row.xpath('.//div[@class="username"]/a')[0].text
+            times = row.xpath('.//div[@class="post-wrapper"]/'
+                              'following-sibling::div/div/div')[0]
+            posttime = clock.timestamps(
+                    [times.text.split('·')[0].strip()])[0]
+            if posts and posttime <= posts[-1][1]:
+                posttime = posts[-1][1] + 1
+            posts.append((author, posttime))
+    return subject, posts
+
+# {name: [threads]} of every forum and subforum, and {name: [threads]}
+# of every category, including those of its forums
+def read_forums(gen, site):
+    clock = Clock(NOW)
+    forums = {}
+    categories = {}
+
+    def read_forum(a, category):
+        url = urljoin(gen.forum_url, a.get('href'))
+        threads = []
+        for page in read_pages(site, url):
+            threads.extend(read_thread(site, urljoin(url, t.get('href')),
+                                       clock)
+                           for t in page.xpath(
+                                   '//tr[@class="row"]/td/'
+                                   'a[contains(@class, "thread-subject")]'))
+        forums[a.text.strip()] = threads
+        categories[category].extend(threads)
+        first = html.fromstring(site[url])
+        for sf in first.xpath('//div[contains(@class, "subforums-block")]'
+                              '//a'):
+            read_forum(sf, category)
+
+    index = html.fromstring(site[gen.forum_url])
+    for box in index.xpath('//div[contains(@class, "category")]'):
+        category = box.xpath('.//span')[0].text.strip()
+        categories[category] = []
+        for a in box.xpath('.//td[contains(@class, "forum")]//a'):
+            read_forum(a, category)
+    return forums, categories
+
+def test_counts(gen, tmp_path):
+    site = gen.forum_pages()
+    users = gen.get_user_map()
+    db, counts = parse(gen, str(tmp_path / 'forum.pkl'))
+    forums, categories = read_forums(gen, site)
+    tids = {row[2]: row[0] for row in db['threads']}
+
+    # Threads are numbered in the order the parser reads them, and the
+    # earlier one is kept on a tie
+    def lastpost(threads):
+        best = None
+        for subject, posts in sorted(threads, key=lambda t: tids[t[0]]):
+            author, posttime = posts[-1]
+            if best is None or posttime > best[0]:
+                best = (posttime, author, users.get(author, 0),
+                        tids[subject], subject)
+        return best or (0, 0, 0, 0, '')
+
+    rows = {row[1].strip(): row for row in db['forums']}
+    assert sorted(rows) == sorted(list(forums) + list(categories))
+    assert any(len(rows[name][6].split(',')) == 3 for name in forums)
+    for name, threads in forums.items():
+        row = rows[name]
+        assert row[10] == len(threads)
+        assert row[11] == sum(len(posts) for _, posts in threads)
+        # Forums show the last post of their subforums too
+        subforums = [f for f, r in rows.items() if r[5] == row[0]]
+        assert tuple(row[12:17]) == lastpost(
+                threads + [t for f in subforums for t in forums[f]])
+    for name, threads in categories.items():
+        assert rows[name][10:12] == [0, 0]
+        assert tuple(rows[name][12:17]) == lastpost(threads)
+
+    expected = {}
+    for threads in forums.values():
+        for _, posts in threads:
+            expected.setdefault(users.get(posts[0][0], 0), [0, 0, 0])[1] += 1
+            for author, posttime in posts:
+                count = expected.setdefault(users.get(author, 0), [0, 0, 0])
+                count[0] += 1
+                count[2] = max(count[2], posttime)
+    assert counts == {uid: tuple(c) for uid, c in expected.items()}
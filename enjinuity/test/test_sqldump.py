@@ -0,0 +1,58 @@
+# enjinuity
+# Written in 2016 by David H. Wei <https://github.com/spikeh/>
+#
+# To the extent possible under law, the author(s) have dedicated all
+# copyright and related and neighboring rights to this software to the
+# public domain worldwide. This software is distributed without any
+# warranty.
+#
+# You should have received a copy of the CC0 Public Domain Dedication
+# along with this software. If not, see
+# <http://creativecommons.org/publicdomain/zero/1.0/>.
+import gzip
+from enjinuity.sqldump import SqlWriter, mysql_footer, mysql_header
+from enjinuity.sqldump import pgsql_footer, pgsql_header
+
+message = 'It\'s a \\ line\r\nwith\0NUL and \x1a'
+
+def write(filename, dbtype):
+    with SqlWriter(filename, dbtype, 'mybb_', batch_size=2) as db:
+        db['posts'].append([1, message, None])
+        db['posts'].append([2, 'plain', 0])
+        db['posts'].append([3, '', 5])
+        db['forums'].append([1, 'Forum', None])
+
+def test_mysql(tmp_path):
+    filename = str(tmp_path / 'forum.sql')
+    write(filename, 'mysql')
+    with open(filename, encoding='utf-8', newline='') as f:
+        text = f.read()
+    assert text == '\n'.join(mysql_header) + '\n\n' + (
+            'INSERT INTO mybb_posts VALUES\n'
+            '(1,\'It\\\'s a \\\\ line\\r\\nwith\\0NUL and \\Z\',NULL),\n'
+            '(2,\'plain\',0);\n'
+            'INSERT INTO mybb_posts VALUES\n'
+            '(3,\'\',5);\n'
+            'INSERT INTO mybb_forums VALUES\n'
+            '(1,\'Forum\',NULL);\n'
+            '\n') + '\n'.join(mysql_footer) + '\n'
+
+def test_pgsql(tmp_path):
+    filename = str(tmp_path / 'forum.sql.gz')
+    write(filename, 'pgsql')
+    with gzip.open(filename, 'rt', encoding='utf-8', newline='') as f:
+        text = f.read()
+    assert text == '\n'.join(pgsql_header) + '\n\n' + (
+            'INSERT INTO mybb_posts VALUES\n'
+            '(1,\'It\'\'s a \\ line\r\nwithNUL and \x1a\',NULL),\n'
+            '(2,\'plain\',0);\n'
+            'INSERT INTO mybb_posts VALUES\n'
+            '(3,\'\',5);\n'
+            'INSERT INTO mybb_forums VALUES\n'
+            '(1,\'Forum\',NULL);\n'
+            '\n'
+            'SELECT setval(pg_get_serial_sequence(\'mybb_posts\', \'pid\'), '
+            'MAX(pid)) FROM mybb_posts HAVING MAX(pid) IS NOT NULL;\n'
+            'SELECT setval(pg_get_serial_sequence(\'mybb_forums\', \'fid\'), '
+            'MAX(fid)) FROM mybb_forums HAVING MAX(fid) IS NOT NULL;\n'
+            ) + '\n'.join(pgsql_footer) + '\n'
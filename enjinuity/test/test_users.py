@@ -0,0 +1,98 @@
+# enjinuity
+# Written in 2016 by David H. Wei <https://github.com/spikeh/>
+#
+# To the extent possible under law, the author(s) have dedicated all
+# copyright and related and neighboring rights to this software to the
+# public domain worldwide. This software is distributed without any
+# warranty.
+#
+# You should have received a copy of the CC0 Public Domain Dedication
+# along with this software. If not, see
+# <http://creativecommons.org/publicdomain/zero/1.0/>.
+import pytest
+from datetime import datetime, timedelta, timezone
+from enjinuity import users
+from enjinuity.dates import Clock
+from enjinuity.test.generator import SiteGenerator
+from lxml import html
+
+error_page = b'<html><body><p>Internal server error</p></body></html>'
+
+
+class FakeFetcher:
+    """Serves generated pages; a URL in `failures` gets the error page
+    that many times first."""
+
+    pages = {}
+    failures = {}
+    fetched = []
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+
+    def get(self, url, check=None):
+        FakeFetcher.fetched.append(url)
+        if FakeFetcher.failures.get(url):
+            FakeFetcher.failures[url] -= 1
+            return html.fromstring(error_page, url)
+        return html.fromstring(FakeFetcher.pages[url], url)
+
+    def quit(self):
+        pass
+
+
+@pytest.fixture
+def gen(monkeypatch):
+    gen = SiteGenerator(members=30, members_per_page=10)
+    FakeFetcher.pages = gen.member_pages()
+    FakeFetcher.failures = {}
+    FakeFetcher.fetched = []
+    monkeypatch.setattr(users, 'BrowserFetcher', FakeFetcher)
+    return gen
+
+def scrape(gen, **kwargs):
+    return users.Users(gen.members_url, 'default@email.com', 'password',
+                       ['Member'], workers=2, **kwargs)
+
+def test_all_pages(gen):
+    assert scrape(gen).get_map() == gen.get_user_map()
+
+def test_member_page_retried(gen):
+    FakeFetcher.failures[gen.members_url + '/page/2'] = 2
+    assert scrape(gen).get_map() == gen.get_user_map()
+
+def test_member_page_missing(gen):
+    # Members after a page that never loads would get the wrong uids
+    FakeFetcher.failures[gen.members_url + '/page/3'] = 3
+    with pytest.raises(ValueError):
+        scrape(gen)
+
+def test_cache_across_runs(gen, tmp_path, monkeypatch):
+    cache = str(tmp_path / 'profiles')
+    first = scrape(gen, cache=cache)
+    # Relative last seen dates resolve differently an hour later, but the
+    # member list shows the same text, so no profile is fetched again and
+    # the dates are those of the later run
+    later = datetime.now(tz=timezone.utc) + timedelta(hours=1)
+    monkeypatch.setattr(users, 'Clock', lambda: Clock(later))
+    FakeFetcher.fetched = []
+    second = scrape(gen, cache=cache)
+    assert all('/profile/' not in url for url in FakeFetcher.fetched)
+    assert second.users == scrape(gen).users
+    assert second.users != first.users
+    # Profiles fetched again take the dates as of the later run
+    FakeFetcher.fetched = []
+    third = scrape(gen, cache=cache, max_age=-1)
+    assert any('/profile/' in url for url in FakeFetcher.fetched)
+    assert [(u[0], u[3]) for u in third.users] == [(u[0], u[3])
+                                                   for u in first.users]
+
+def test_cache_renamed_member(gen, tmp_path):
+    cache = str(tmp_path / 'profiles')
+    scrape(gen, cache=cache)
+    # The profile URL stays the same when a member is renamed
+    FakeFetcher.pages[gen.members_url] = FakeFetcher.pages[
+            gen.members_url].replace(b'>member1<', b'>renamed<')
+    user_map = scrape(gen, cache=cache).get_map()
+    assert 'renamed' in user_map
+    assert 'member1' not in user_map
@@ -11,12 +11,18 @@
 # <http://creativecommons.org/publicdomain/zero/1.0/>.
 import hashlib
 import pickle
+import queue
 import random
+import shelve
 import string
 import time
-from enjinuity.objects import get_datetime
-from lxml import html
-from selenium import webdriver
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from enjinuity.dates import Clock
+from enjinuity.fetcher import BrowserFetcher, HttpFetcher
+from enjinuity.layout import layout
+from enjinuity.metrics import metrics
+from enjinuity.sqldump import SqlWriter
 from urllib.parse import urljoin
 
 def random_string(length):
@@ -26,11 +32,20 @@ def random_string(length):
 def md5(string):
     return hashlib.md5(string.encode()).hexdigest()
 
+def has_members(elem):
+    return len(layout.members(elem)) > 0
+
+# What is known of a member, by profile URL in the cache; fetched is the
+# time the profile was last loaded and seen is the last seen text of the
+# member list, which the timestamp is read from relative to each run
+Profile = namedtuple('Profile', 'name joindate lastseen rep fetched seen')
+
 
 class Users:
 
-    def __init__(self, url, email, passwd, validtags=[]):
-        self.url = url
+    def __init__(self, url, email, passwd, validtags=[], backend='browser',
+                 workers=1, retries=2, cache=None, max_age=None):
+        self.url = url.rstrip('/')
         self.email = email
         self.passwd = passwd
         self.validtags = validtags
@@ -41,55 +56,197 @@ class Users:
         self.db = {}
         # Map of username->uid
         self.user_map = {}
+        # Relative dates are read as of the start of the scrape
+        self.clock = Clock()
+        # Times a profile that failed to load is fetched again
+        self.retries = retries
+        # Cached profiles are fetched again after max_age seconds, or
+        # when the member was seen since
+        self.max_age = max_age
 
-        self.browser = webdriver.PhantomJS()
-        self.browser.get(url)
-        page = html.fromstring(self.browser.page_source, urljoin(url, '/'))
-        self._scrape_users(page)
-        self.browser.quit()
+        base_url = urljoin(url, '/')
+        workers = max(1, workers)
+        if backend == 'browser':
+            # Browsers are only started once they are used
+            self.fetchers = [BrowserFetcher(base_url) for _ in range(workers)]
+        elif backend == 'http':
+            # The browser is only started if a page fails to load
+            self.fetchers = [HttpFetcher(base_url, pool_size=workers,
+                                         fallback=BrowserFetcher(base_url))]
+            self.fetchers *= workers
+        else:
+            raise ValueError('Unknown backend {}'.format(backend))
+        self.idle = queue.Queue()
+        for fetcher in self.fetchers:
+            self.idle.put(fetcher)
+        with ThreadPoolExecutor(workers) as executor:
+            if cache:
+                with shelve.open(cache) as profiles:
+                    self._scrape_users(executor, profiles)
+            else:
+                self._scrape_users(executor, {})
+        self._quit()
+        # Users are numbered in the order they were scraped
+        for uid, user in enumerate(self.users, 2):
+            self.user_map[user[0]] = uid
 
     def __del__(self):
-        if self.browser:
-            self.browser.quit()
+        self._quit()
+
+    def _quit(self):
+        for fetcher in getattr(self, 'fetchers', []):
+            fetcher.quit()
+        self.fetchers = []
+
+    # Fetch a page with whichever fetcher is free
+    def _get(self, url, check=None):
+        fetcher = self.idle.get()
+        try:
+            return fetcher.get(url, check)
+        finally:
+            self.idle.put(fetcher)
+
+    def _scrape_users(self, executor, profiles):
+        pages = self._fetch_member_pages(executor, [self.url])
+        nr_pages = layout.member_pages(pages[0])
+        if len(nr_pages):
+            urls = ['{}/page/{}'.format(self.url, i) for i in
+                    range(2, int(nr_pages[0].get('maxlength')) + 1)]
+            pages.extend(self._fetch_member_pages(executor, urls))
+
+        # Only the profiles of users with a tag in validtags are fetched
+        members = []
+        for page in pages:
+            members.extend(self._read_members(page))
+
+        joindates = self.clock.timestamps([m[2] for m in members])
+        lastseens = self.clock.timestamps([m[3] for m in members])
+        members = [(name, url, joindate, lastseen, seen)
+                   for (name, url, _, seen), joindate, lastseen
+                   in zip(members, joindates, lastseens)]
 
-    def _scrape_users(self, page):
-        for row in page.xpath('.//tr[@class="row"]'):
-            tags = row.xpath('td[contains(@class, "col-tags")]')
+        # Profiles are fetched again if the member list shows a different
+        # last seen text; "2 hours ago" resolves differently every run
+        now = time.time()
+        stale = []
+        for member in members:
+            profile = profiles.get(member[1])
+            if (profile is None or profile.seen != member[4] or
+                    self.max_age is not None and
+                    now - profile.fetched > self.max_age):
+                stale.append(member)
+        metrics.add('profiles_cached', len(members) - len(stale))
+        metrics.set_total('profiles', 'profiles_fetched',
+                          metrics.get('profiles_fetched') + len(stale))
+        reps, error = self._fetch_reputations(executor,
+                                              [m[1] for m in stale])
+        # Profiles that loaded are kept even if others did not
+        for (name, url, joindate, lastseen, seen), rep in zip(stale, reps):
+            if rep is not None:
+                profiles[url] = Profile(name, joindate, lastseen, rep,
+                                        int(now), seen)
+        if error:
+            raise error
+
+        # Only the reputation is taken from the cache; the rest is as the
+        # member list shows it now
+        for name, url, joindate, lastseen, seen in members:
+            profile = profiles[url]
+            if profile.lastseen != lastseen or profile.seen != seen:
+                profiles[url] = profile._replace(lastseen=lastseen,
+                                                 seen=seen)
+            self.users.append((name, joindate, lastseen, profile.rep))
+
+    def _read_members(self, page):
+        for row in layout.members(page):
+            tags = layout.member_tags(row)
             tags = [t.text for t in tags[0].findall('span')]
 
             # Skip users that do not have any tags in validtags
             if set(tags).isdisjoint(self.validtags):
                 continue
 
-            displayname = row.xpath(
-                    'td[contains(@class, "col-displayname")]/a')[0]
-            name = displayname.text_content()
+            displayname = layout.member_name(row)[0]
+            yield (displayname.text_content(),
+                   urljoin(page.base_url, displayname.get('href')),
+                   layout.member_joined(row)[0].text_content(),
+                   layout.member_lastseen(row)[0].text_content())
 
-            joindate = row.xpath(
-                    'td[contains(@class, "col-datejoined")]')[0].text_content()
-            joindate = int(get_datetime(joindate).timestamp())
+    def _read_member_page(self, url):
+        page = self._get(url, has_members)
+        return page if has_members(page) else None
 
-            lastseen = row.xpath(
-                    'td[contains(@class, "col-lastseen")]')[0].text_content()
-            if lastseen == 'Online Now':
-                lastseen = int(time.time())
-            else:
-                lastseen = int(get_datetime(lastseen).timestamp())
+    def _read_reputation(self, url):
+        rep = layout.reputation(self._get(url))
+        if not len(rep):
+            return None
+        metrics.add('profiles_fetched')
+        return int(rep[0].text)
 
-            self.browser.get(urljoin(page.base_url, displayname.get('href')))
-            user_page = html.fromstring(self.browser.page_source)
-            try:
-                rep = int(user_page.xpath(
-                        '//div[@class="widget_ministats"]/div[3]/h4')[0].text)
-            except IndexError:
-                # Deleted accounts are redirected to the home page
-                rep = 0
+    # Pages that fail to load, or that read() finds nothing on, are
+    # queued and fetched again up to self.retries times. Returns what
+    # read() returned for each URL, None where it never found anything,
+    # and the errors of the URLs that failed on their last attempt.
+    def _fetch_retrying(self, executor, urls, read, counter):
+        results = [None] * len(urls)
+        errors = {}
+        pending = list(range(len(urls)))
+        for attempt in range(self.retries + 1):
+            if not pending:
+                break
+            if attempt:
+                metrics.add(counter, len(pending))
+            futures = [executor.submit(read, urls[i]) for i in pending]
+            retry = []
+            for i, future in zip(pending, futures):
+                try:
+                    results[i] = future.result()
+                    errors.pop(i, None)
+                except Exception as e:
+                    print('WARN:\tFailed to load:\t', urls[i], e)
+                    errors[i] = e
+                if results[i] is None:
+                    retry.append(i)
+            pending = retry
+        return results, errors
 
-            print('INFO:\t', name, joindate, lastseen, rep)
-            self.users.append((name, joindate, lastseen, rep))
+    # Every page of the member list must have members, or the uids of the
+    # members after it would shift
+    def _fetch_member_pages(self, executor, urls):
+        pages, errors = self._fetch_retrying(executor, urls,
+                                             self._read_member_page,
+                                             'member_page_retries')
+        for i, page in enumerate(pages):
+            if page is None:
+                print('ERROR:\tGiving up on member list:\t', urls[i])
+                raise errors.get(i) or ValueError(
+                        'Could not find members in {}'.format(urls[i]))
+        return pages
+
+    # Returns the reputations, None for profiles that never loaded, and
+    # the first error of those. A profile that loads without a
+    # reputation is taken as deleted.
+    def _fetch_reputations(self, executor, urls):
+        reps, errors = self._fetch_retrying(executor, urls,
+                                            self._read_reputation,
+                                            'profile_retries')
+        error = None
+        for i, rep in enumerate(reps):
+            if rep is not None:
+                continue
+            if i in errors:
+                print('ERROR:\tGiving up on profile:\t', urls[i])
+                error = error or errors[i]
+                continue
+            # Deleted accounts are redirected to the home page
+            print('WARN:\tNo reputation, taking as deleted:\t', urls[i])
+            reps[i] = 0
+            metrics.add('profiles_fetched')
+        return reps, error
 
     # http://docs.mybb.com/1.6/Database-Tables-mybb-users/
-    def _format_mybb(self):
+    # counts maps uid to (postnum, threadnum, lastpost)
+    def _format_mybb(self, counts):
         # First available user id
         uid = 2
         # First available reputation id
@@ -98,6 +255,7 @@ class Users:
         self.db['users'] = []
         self.db['reputation'] = []
         for name, joindate, lastseen, rep in self.users:
+            postnum, threadnum, lastpost = counts.get(uid, (0, 0, 0))
             salt = random_string(8)
             saltedpw = md5(md5(salt) + md5(self.passwd))
             loginkey = random_string(50)
@@ -108,8 +266,8 @@ class Users:
                 salt,
                 loginkey,
                 self.email,
-                0,          # postnum
-                0,          # threadnum
+                postnum,
+                threadnum,
                 '',         # avatar
                 '',         # avatardimensions
                 0,          # avatartype
@@ -120,7 +278,7 @@ class Users:
                 joindate,   # regdate
                 lastseen,   # lastactive
                 lastseen,   # lastvisit
-                0,          # lastpost
+                lastpost,
                 '',         # website
                 '',         # icq
                 '',         # aim
@@ -197,21 +355,28 @@ class Users:
                 now,        # dateline
                 ''          # comments
             ])
-            self.user_map[name] = uid
             uid += 1
             rid += 1
 
-    def dump_mybb(self, filename):
-        if not self.db:
-            self._format_mybb()
+    # Pass Parser.get_user_counts() as counts once the forum is dumped
+    def dump_mybb(self, filename, counts=None):
+        if not self.db or counts is not None:
+            self._format_mybb(counts or {})
         pickle.dump(self.db, open(filename, 'wb'))
+        for table, rows in self.db.items():
+            metrics.add('rows.' + table, len(rows))
+
+    def dump_sql(self, filename, dbtype, prefix='', batch_size=1000,
+                 counts=None):
+        if not self.db or counts is not None:
+            self._format_mybb(counts or {})
+        with SqlWriter(filename, dbtype, prefix, batch_size) as db:
+            for table, rows in self.db.items():
+                for row in rows:
+                    db[table].append(row)
 
     def get_map(self):
-        if not self.db:
-            raise RuntimeError('ERROR: Call a dump_xxx function first.')
         return self.user_map
 
     def dump_map(self, filename):
-        if not self.db:
-            raise RuntimeError('ERROR: Call a dump_xxx function first.')
         pickle.dump(self.user_map, open(filename, 'wb'))